@@ -0,0 +1,89 @@
+"""
+Measures the caller-side cost per logged record of the logging setups the pipeline can run with
+(wall-clock, which includes the time the listener thread holds the GIL, and the calling thread's CPU):
+a synchronous FileHandler (the previous get_logger setup), the queue-backed handler with text or
+JSON output, the queue-backed handler once a call site is rate limited, and a record below LOG_LEVEL.
+
+    PYTHONPATH=src python benchmarks/bench_logging.py --records 100000
+"""
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+from etl_pipeline.logger import DroppingQueueHandler, JsonFormatter, RateLimitFilter, TEXT_FORMAT
+
+
+def bench(logger, records, level=logging.INFO):
+    """Returns the wall-clock and the calling thread's CPU seconds to log records records."""
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    for i in range(records):
+        logger.log(level, "Attempting to insert record for user_id %s with extraction_ts %s", i, 1234567890)
+    return time.perf_counter() - start, time.thread_time() - start_cpu
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(f"bench_logging.{name}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def queued(path, formatter, rate=0.0, queue_size=0):
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(formatter)
+    handler = DroppingQueueHandler(queue.SimpleQueue(), queue_size)
+    handler.addFilter(RateLimitFilter(rate))
+    listener = QueueListener(handler.queue, file_handler)
+    listener.start()
+    return handler, listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.records} records")
+    print(f"{'setup':<28} {'us/record':>10} {'cpu us/rec':>10} {'drain s':>10} {'lines':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        def report(name, timings, drain, path):
+            elapsed, cpu = timings
+            with open(path) as f:
+                lines = sum(1 for _ in f)
+            print(f"{name:<28} {elapsed / args.records * 1e6:>10.2f} {cpu / args.records * 1e6:>10.2f} {drain:>10.2f} {lines:>10}")
+
+        path = os.path.join(directory, "sync.log")
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        report("sync file, text", bench(make_logger("sync", handler), args.records), 0.0, path)
+        handler.close()
+
+        for name, formatter, rate in (
+            ("queue, text", logging.Formatter(TEXT_FORMAT), 0.0),
+            ("queue, json", JsonFormatter(), 0.0),
+            ("queue, json, rate 50/s", JsonFormatter(), 50.0),
+        ):
+            path = os.path.join(directory, f"{name}.log".replace(" ", "_").replace(",", "").replace("/", ""))
+            handler, listener = queued(path, formatter, rate)
+            elapsed = bench(make_logger(name, handler), args.records)
+            start = time.perf_counter()
+            listener.stop()
+            drain = time.perf_counter() - start
+            for output in listener.handlers:
+                output.close()
+            report(name, elapsed, drain, path)
+
+        path = os.path.join(directory, "below_level.log")
+        handler, listener = queued(path, JsonFormatter())
+        elapsed = bench(make_logger("below_level", handler), args.records, level=logging.DEBUG)
+        listener.stop()
+        report("below LOG_LEVEL (debug)", elapsed, 0.0, path)
+
+
+if __name__ == "__main__":
+    main()
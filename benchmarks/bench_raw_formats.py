@@ -0,0 +1,51 @@
+"""
+Measures write time, read time and bytes on disk for every raw datalake encoding.
+
+    PYTHONPATH=src python benchmarks/bench_raw_formats.py --records 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from etl_pipeline import raw_format
+from etl_pipeline.synthetic import generate_users
+
+
+def bench(data, fmt, directory, repeat):
+    path = os.path.join(directory, raw_format.raw_file_name(1234567890, fmt))
+    write_times, read_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        raw_format.write_raw(data, path, fmt)
+        write_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        with raw_format.open_raw(path) as f:
+            count = sum(1 for _ in raw_format.iter_raw_records(f, path))
+        read_times.append(time.perf_counter() - start)
+        assert count == len(data)
+    return min(write_times), min(read_times), os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = generate_users(args.records)
+    print(f"{args.records} records, best of {args.repeat}")
+    print(f"{'format':<12} {'write ms':>10} {'read ms':>10} {'bytes':>12} {'vs pretty':>10}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in raw_format.RAW_FORMATS:
+            if fmt.endswith(".zst") and raw_format.zstandard is None:
+                print(f"{fmt:<12} skipped (zstandard not installed)")
+                continue
+            write_s, read_s, size = bench(data, fmt, directory, args.repeat)
+            baseline = baseline or size
+            print(f"{fmt:<12} {write_s * 1000:>10.1f} {read_s * 1000:>10.1f} {size:>12,} {size / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
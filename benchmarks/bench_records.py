@@ -0,0 +1,88 @@
+"""
+Compares the processed record types with the Pydantic models they replaced: memory per record
+(tracemalloc, while the records are held in a list) and rows/s to build the records and write
+them to CSV (building only, then through the csv writer as the transformer does).
+
+    PYTHONPATH=src python benchmarks/bench_records.py --records 100000
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+from typing import Optional
+
+from pydantic import BaseModel
+
+from etl_pipeline.models import ProcessedUser
+
+EXTRACTION_ISO = "2009-02-13T23:31:30+00:00"
+
+
+class PydanticProcessedUser(BaseModel):
+    """The previous ProcessedUser: validated on construction, with a path_name column, written via dict()."""
+
+    user_id: int
+    username: str
+    phone: str
+    email: str
+    website: str
+    company_id: Optional[int]
+    extraction_ts: str
+    path_name: str = "processed_user"
+
+
+def build_pydantic(records):
+    return [
+        PydanticProcessedUser(user_id=i, username=f"user{i}", phone="1-770-736-8031", email=f"user{i}@example.org",
+                              website="example.org", company_id=i % 50, extraction_ts=EXTRACTION_ISO)
+        for i in range(records)
+    ]
+
+
+def build_records(records):
+    return [
+        ProcessedUser(user_id=i, username=f"user{i}", phone="1-770-736-8031", email=f"user{i}@example.org",
+                      website="example.org", company_id=i % 50, extraction_ts=EXTRACTION_ISO)
+        for i in range(records)
+    ]
+
+
+def write_pydantic(instances):
+    writer = csv.DictWriter(io.StringIO(), fieldnames=list(PydanticProcessedUser.__fields__))
+    writer.writerows(instance.dict() for instance in instances)
+
+
+def write_records(instances):
+    csv.writer(io.StringIO()).writerows(instances)
+
+
+def memory_per_record(build, records):
+    # The field values (strings) are the same for both types; only the containers differ.
+    tracemalloc.start()
+    instances = build(records)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return size / records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.records} records")
+    print(f"{'type':<12} {'bytes/record':>13} {'build rows/s':>13} {'build+write rows/s':>19}")
+    for name, build, write in (("pydantic", build_pydantic, write_pydantic), ("namedtuple", build_records, write_records)):
+        per_record = memory_per_record(build, args.records)
+        start = time.perf_counter()
+        instances = build(args.records)
+        built = time.perf_counter() - start
+        write(instances)
+        total = time.perf_counter() - start
+        print(f"{name:<12} {per_record:>13.0f} {args.records / built:>13.0f} {args.records / total:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark suite for every pipeline stage on seeded synthetic JSONPlaceholder users.
+
+Each (stage, scale) runs in its own subprocess so peak RSS is measured in isolation, against
+SQLite and files in a temporary directory. Results are written as JSON and compared with a
+stored baseline; a stage whose records/s drops (or peak RSS grows) by more than --threshold
+is reported as a regression and the exit code is 1. A missing baseline exits with status 2,
+unless --no-compare is given.
+
+    PYTHONPATH=src python benchmarks/run_benchmarks.py --scale 1k 100k
+    PYTHONPATH=src python benchmarks/run_benchmarks.py --scale 1k --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+EXTRACTION_TS = 1234567890
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "latest.json")
+
+
+def _sqlite_session(workdir):
+    from sqlmodel import Session, SQLModel
+    from etl_pipeline.ingestor import make_engine
+
+    engine = make_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def _raw_file(users, workdir):
+    path = os.path.join(workdir, f"raw_data_{EXTRACTION_TS}.json")
+    with open(path, "w") as f:
+        json.dump(users, f)
+    return path
+
+
+# Each stage prepares its input outside the timed region and returns the callable to time.
+def stage_validate_data(users, workdir):
+    from etl_pipeline.extractor import validate_data
+
+    return lambda: validate_data(users, EXTRACTION_TS)
+
+
+def stage_user_from_api(users, workdir):
+    from etl_pipeline.models import User
+
+    def run():
+        for record in users:
+            User.from_api(record, EXTRACTION_TS)
+    return run
+
+
+def stage_process_and_insert(users, workdir):
+    from etl_pipeline.ingestor import process_and_insert
+
+    session = _sqlite_session(workdir)
+
+    def run():
+        for record in users:
+            process_and_insert(session, record, EXTRACTION_TS)
+        session.commit()
+    return run
+
+
+def stage_bulk_insert(users, workdir):
+    from etl_pipeline.ingestor import bulk_insert
+
+    session = _sqlite_session(workdir)
+
+    def run():
+        bulk_insert(session, users, EXTRACTION_TS)
+        session.commit()
+    return run
+
+
+def stage_generic_transform(users, workdir):
+    from etl_pipeline import transform
+
+    transform.PROCESSED_DIR = os.path.join(workdir, "processed")
+    raw_file = _raw_file(users, workdir)
+    return lambda: transform.generic_transform(raw_file, EXTRACTION_TS, transform.default_transformation_fn)
+
+
+def stage_generic_transform_batch(users, workdir):
+    from etl_pipeline import transform
+
+    transform.PROCESSED_DIR = os.path.join(workdir, "processed")
+    raw_file = _raw_file(users, workdir)
+    return lambda: transform.generic_transform(
+        raw_file, EXTRACTION_TS, transform.default_transformation_fn,
+        batch_fn=transform.default_batch_transformation_fn,
+    )
+
+
+def stage_generic_write_csv(users, workdir):
+    from datetime import datetime, timezone
+    from etl_pipeline import transform
+
+    extraction_iso = datetime.fromtimestamp(EXTRACTION_TS, tz=timezone.utc).isoformat()
+    instances = [transform.default_transformation_fn(record, extraction_iso)["processed_user"] for record in users]
+    model_cls = transform.OUTPUT_MODEL_MAPPING["processed_user"]
+    return lambda: transform.generic_write_csv(model_cls, instances, EXTRACTION_TS, os.path.join(workdir, "processed"))
+
+
+STAGES = {
+    "validate_data": stage_validate_data,
+    "user_from_api": stage_user_from_api,
+    "process_and_insert": stage_process_and_insert,
+    "bulk_insert": stage_bulk_insert,
+    "generic_transform": stage_generic_transform,
+    "generic_transform_batch": stage_generic_transform_batch,
+    "generic_write_csv": stage_generic_write_csv,
+}
+
+
+def _current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def run_child(stage, records, seed):
+    """Runs one stage in this process and prints its measurements as one JSON line."""
+    import logging
+    from etl_pipeline.synthetic import generate_users
+
+    # Per-record INFO logging would dominate the timings; only warnings and errors are kept.
+    logging.disable(logging.INFO)
+    users = generate_users(records, seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        run = STAGES[stage](users, workdir)
+        setup_rss = _current_rss_mb()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "stage": stage,
+        "records": records,
+        "seconds": seconds,
+        "records_per_sec": records / seconds if seconds > 0 else None,
+        "setup_rss_mb": round(setup_rss, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+    }))
+
+
+def run_suite(stages, scales, seed):
+    """Runs every stage at every scale; returns the results and the (stage, scale) runs that failed."""
+    results, failures = [], []
+    for scale in scales:
+        for stage in stages:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", stage, "--records", str(SCALES[scale]), "--seed", str(seed)],
+                capture_output=True, text=True,
+                # SQL echo would flood the child's stdout, which carries the result line.
+                env={**os.environ, "DB_ECHO": "false"},
+            )
+            if completed.returncode != 0:
+                print(f"{stage} @ {scale} failed:\n{completed.stderr}", file=sys.stderr)
+                failures.append({"stage": stage, "scale": scale, "returncode": completed.returncode})
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            result["scale"] = scale
+            results.append(result)
+            print(f"{stage:<25} {scale:>5} {result['seconds']:>9.3f}s {result['records_per_sec']:>12,.0f} rec/s "
+                  f"{result['peak_rss_mb']:>8.1f} MB peak")
+    return results, failures
+
+
+def compare(results, baseline, threshold):
+    """Returns human-readable regressions of results against baseline (same stage and scale)."""
+    previous = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["stage"], result["scale"]))
+        if before is None:
+            continue
+        if result["records_per_sec"] < before["records_per_sec"] * (1 - threshold):
+            regressions.append(f"{result['stage']} @ {result['scale']}: {result['records_per_sec']:,.0f} rec/s "
+                               f"vs baseline {before['records_per_sec']:,.0f}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{result['stage']} @ {result['scale']}: peak RSS {result['peak_rss_mb']} MB "
+                               f"vs baseline {before['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline stage benchmarks")
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["1k"])
+    parser.add_argument("--stage", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--no-compare", action="store_true", help="Only report the results, without a baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression.")
+    parser.add_argument("--child", choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument("--records", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.records, args.seed)
+        return 0
+
+    results, failures = run_suite(args.stage, args.scale, args.seed)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "results": results,
+        "failures": failures,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    # A stage that crashes has no result to compare: fail instead of reporting on the others only.
+    for failure in failures:
+        print(f"FAILED {failure['stage']} @ {failure['scale']} (exit status {failure['returncode']})")
+    if failures:
+        return 1
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if args.no_compare:
+        return 0
+    if not os.path.exists(args.baseline):
+        # Without a baseline no regression can be detected: fail rather than pass silently.
+        print(f"No baseline at {args.baseline}. Baselines are machine specific: record one on this machine with\n"
+              f"  make bench-baseline\n"
+              f"(or --save-baseline), or pass --no-compare to only report the results.", file=sys.stderr)
+        return 2
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
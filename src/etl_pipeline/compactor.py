@@ -0,0 +1,441 @@
+"""
+Hourly compaction of the raw and processed datalake.
+
+Every closed hourly partition (YYYY-MM-DD/HH, at least COMPACT_GRACE_SECONDS after the end of the
+hour) is rewritten as a single sorted, compressed file:
+  - processed/<model>/YYYY-MM-DD/HH: one COMPACT_FORMAT file (colz by default) per model, with the rows
+    of all processed_<model>_<ts> files sorted by extraction_ts and the model's first column
+  - raw/YYYY-MM-DD/HH and resources/<name>/YYYY-MM-DD/HH: one ndjson.gz file with one
+    {"extraction_ts", "records"} line per snapshot, sorted by extraction_ts; raw users partitions are
+    only compacted once every raw file in them has been transformed
+
+Each compacted partition has an index, _compacted.json, listing the file and the source timestamps
+it holds. The index is the commit point of the swap: the new compacted file is written under a
+fresh name, the index is atomically replaced to point at it, and only then are the source files
+and the previous compacted file removed. Readers that follow the index (see is_compacted and
+etl_pipeline.reader) therefore always see every timestamp exactly once, and an interrupted run leaves either the old or the new
+state, whose leftovers the next run deletes.
+
+A processed snapshot (the outputs of one raw file, one file per model) is only part of the datalake
+once its commit marker, processed/_commits/YYYY-MM-DD/HH/<ts>, exists: the transformer creates it after
+renaming every output into place. Loose files without one are neither compacted nor read.
+"""
+import calendar
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from etl_pipeline.logger import get_logger
+from etl_pipeline.metrics import COMPACTED_FILES, metrics_port, start_metrics_server, timed
+from etl_pipeline.raw_format import RAW_FILE_PREFIX, split_raw_file_name, open_raw, iter_raw_records, write_raw
+from etl_pipeline.writers import coerce_value, get_writer, model_schema, writer_for_path
+
+logger = get_logger(__name__)
+
+# Partitions are compacted once their hour ended at least this long ago.
+COMPACT_GRACE_SECONDS = int(os.getenv("COMPACT_GRACE_SECONDS", "600"))
+# Seconds between two compaction runs of run_compactor.
+COMPACT_INTERVAL = int(os.getenv("COMPACT_INTERVAL", "300"))
+# Output format of compacted processed partitions (see writers.WRITERS).
+COMPACT_FORMAT = os.getenv("COMPACT_FORMAT", "colz")
+# Rows per row group of compacted processed files.
+COMPACT_BATCH_SIZE = 10000
+
+INDEX_FILE = "_compacted.json"
+# Directory of the processed snapshots' commit markers (see commit_marker_path).
+COMMITS_DIR = "_commits"
+COMPACTED_PREFIX = "compacted_"
+RAW_COMPACT_FORMAT = "ndjson.gz"
+
+_DATE_DIR = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_HOUR_DIR = re.compile(r"^\d{2}$")
+_PROCESSED_NAME = re.compile(r"^processed_(?P<name>.+)_(?P<ts>\d+)(?P<ext>\.[a-z]+)$")
+_FILE_TS = re.compile(r"_(\d+)\.[a-z.]+$")
+
+# directory -> (index mtime_ns, index, set of timestamps)
+_index_cache = {}
+
+
+def iter_partitions(root: str):
+    """Yields (directory, "YYYY-MM-DD", "HH") for every hourly partition under root, in order."""
+    try:
+        dates = sorted(d for d in os.listdir(root) if _DATE_DIR.match(d))
+    except FileNotFoundError:
+        return
+    for date in dates:
+        date_dir = os.path.join(root, date)
+        try:
+            hours = sorted(h for h in os.listdir(date_dir) if _HOUR_DIR.match(h))
+        except NotADirectoryError:
+            continue
+        for hour in hours:
+            yield os.path.join(date_dir, hour), date, hour
+
+
+def partition_end(date: str, hour: str, utc: bool) -> float:
+    """Epoch time at which the partition's hour ends (processed partitions are UTC, raw ones local time)."""
+    start = datetime.strptime(f"{date} {hour}", "%Y-%m-%d %H")
+    epoch = calendar.timegm(start.timetuple()) if utc else time.mktime(start.timetuple())
+    return epoch + 3600
+
+
+def read_index(directory: str):
+    """Returns the compaction index of a partition directory ({"file", "timestamps", ...}), or None."""
+    path = os.path.join(directory, INDEX_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _index_cache.pop(directory, None)
+        return None
+    cached = _index_cache.get(directory)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            index = json.load(f)
+        cached = _index_cache[directory] = (mtime, index, set(index["timestamps"]))
+    return cached[1]
+
+
+def compacted_timestamps(directory: str) -> set:
+    """Returns the source timestamps held by the partition's compacted file (empty if it has none)."""
+    if read_index(directory) is None:
+        return set()
+    return _index_cache[directory][2]
+
+
+def is_compacted(file_path: str) -> bool:
+    """True if the snapshot file file_path (raw or processed, named *_<ts><ext>) was merged into its partition's compacted file."""
+    match = _FILE_TS.search(os.path.basename(file_path))
+    return match is not None and int(match.group(1)) in compacted_timestamps(os.path.dirname(file_path))
+
+
+def split_processed_file_name(name: str):
+    """Splits a processed file name 'processed_<path_name>_<ts><ext>' into (path_name, ts), or returns None."""
+    match = _PROCESSED_NAME.match(name)
+    if not match:
+        return None
+    return match.group("name"), int(match.group("ts"))
+
+
+def commit_marker_path(processed_dir: str, ts: int) -> str:
+    """
+    Commit marker of the snapshot with timestamp ts: processed_dir/_commits/YYYY-MM-DD/HH/<ts> (UTC hour).
+    The transformer creates it once every output of the snapshot is in place (see transform._commit_sinks).
+    """
+    partition = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
+    return os.path.join(processed_dir, COMMITS_DIR, partition, str(ts))
+
+
+def is_committed(processed_dir: str, ts: int) -> bool:
+    """True if every processed output of the snapshot with timestamp ts was committed."""
+    return os.path.exists(commit_marker_path(processed_dir, ts))
+
+
+def committed_timestamps(directory: str) -> set:
+    """Returns the timestamps of the committed snapshots of a processed partition (<processed_dir>/<model>/YYYY-MM-DD/HH)."""
+    date_dir, hour = os.path.split(directory)
+    model_dir, date = os.path.split(date_dir)
+    try:
+        names = os.listdir(os.path.join(os.path.dirname(model_dir), COMMITS_DIR, date, hour))
+    except FileNotFoundError:
+        return set()
+    return {int(name) for name in names if name.isdigit()}
+
+
+def backfill_commit_markers(processed_dir: str, models) -> int:
+    """
+    Creates the commit markers of a processed datalake written before they existed, once: a snapshot
+    counts as committed when every model has its output, on its own or compacted (the previous rule).
+    Does nothing once processed_dir/_commits exists. Returns the number of markers created.
+    """
+    root = os.path.join(processed_dir, COMMITS_DIR)
+    if os.path.isdir(root):
+        return 0
+    committed = None
+    for model_cls in models:
+        found = set()
+        for directory, _, _ in iter_partitions(os.path.join(processed_dir, model_cls.path_name)):
+            found |= compacted_timestamps(directory)
+            for name in os.listdir(directory):
+                parsed = split_processed_file_name(name)
+                if parsed is not None and parsed[0] == model_cls.path_name:
+                    found.add(parsed[1])
+        committed = found if committed is None else committed & found
+    for ts in committed or ():
+        marker = commit_marker_path(processed_dir, ts)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, "w").close()
+    os.makedirs(root, exist_ok=True)
+    if committed:
+        logger.info("Created commit markers for %d snapshot(s) of %s.", len(committed), processed_dir)
+    return len(committed or ())
+
+
+def output_exists(file_path: str) -> bool:
+    """True if a processed output file exists, either on its own or merged into a compacted file."""
+    return os.path.exists(file_path) or is_compacted(file_path)
+
+
+def _commit(directory: str, file_name: str, timestamps, rows: int, previous):
+    """Atomically points the partition's index at file_name, then removes the previous compacted file."""
+    index = {
+        "file": file_name,
+        "generation": (previous or {}).get("generation", 0) + 1,
+        "timestamps": sorted(timestamps),
+        "rows": rows,
+        "compacted_at": time.time(),
+    }
+    tmp_path = os.path.join(directory, f".{INDEX_FILE}")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+    if previous and previous["file"] != file_name:
+        _remove(os.path.join(directory, previous["file"]))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def merge_sorted(existing, sources):
+    """
+    Yields the items of existing ((key, item) pairs in key order) merged with sources, a list of
+    (key, load) where load() returns the items of one source with that key. A source is only loaded
+    once the merge reaches it, so at most one source is held in memory at a time.
+    """
+    sources = iter(sorted(sources, key=lambda source: source[0]))
+    pending = next(sources, None)
+    for key, item in existing:
+        while pending is not None and pending[0] < key:
+            yield from pending[1]()
+            pending = next(sources, None)
+        yield item
+    while pending is not None:
+        yield from pending[1]()
+        pending = next(sources, None)
+
+
+def _settled(paths, now: float, grace: float) -> bool:
+    """True if none of the files was modified within the last grace seconds (i.e. none is still being written)."""
+    return all(os.path.getmtime(path) <= now - grace for path in paths)
+
+
+def compact_processed_partition(directory: str, model_cls, fmt: str = COMPACT_FORMAT, now: float = None,
+                                grace: float = COMPACT_GRACE_SECONDS) -> int:
+    """
+    Merges the processed_<model>_<ts> files of one partition (and its previous compacted file, if any)
+    into a new compacted file. Returns the number of source files merged.
+    """
+    now = time.time() if now is None else now
+    index = read_index(directory)
+    done = compacted_timestamps(directory)
+    committed = committed_timestamps(directory)
+    sources = []
+    for name in os.listdir(directory):
+        if name.startswith(".processed_"):
+            # Temporary output of a transformer that crashed before renaming it (see transform.temp_output_path),
+            # unless it is still being written.
+            if _settled([os.path.join(directory, name)], now, grace):
+                _remove(os.path.join(directory, name))
+            continue
+        parsed = split_processed_file_name(name)
+        if parsed is None:
+            continue
+        path = os.path.join(directory, name)
+        ts = parsed[1]
+        if ts not in done and ts not in committed:
+            # Renamed into place, but the other outputs of its snapshot were not: not part of the datalake
+            # yet, and overwritten when the transformer redoes the snapshot.
+            continue
+        if ts in done:
+            # Left over by a run interrupted between the index swap and the cleanup.
+            _remove(path)
+        else:
+            sources.append((ts, path))
+    if not sources or not _settled([path for _, path in sources], now, grace):
+        return 0
+
+    schema = model_schema(model_cls)
+    fieldnames = [name for name, _, _ in schema]
+    # Rows are sorted by extraction_ts (the ISO form of the source timestamp), then by the first column.
+    ts_index = fieldnames.index("extraction_ts") if "extraction_ts" in fieldnames else None
+
+    def typed(row):
+        return tuple(coerce_value(row[name], type_name) for name, type_name, _ in schema)
+
+    def ts_key(row):
+        return row[ts_index] if ts_index is not None else ""
+
+    def existing():
+        if index is None:
+            return
+        path = os.path.join(directory, index["file"])
+        for row in writer_for_path(path).iter_rows(path):
+            row = typed(row)
+            yield ts_key(row), row
+
+    def loader(path):
+        return lambda: sorted((typed(row) for row in writer_for_path(path).iter_rows(path)), key=lambda row: (ts_key(row), row[0]))
+
+    def source_key(ts):
+        return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat() if ts_index is not None else ""
+
+    writer = get_writer(fmt)
+    path_name = model_cls.path_name
+    generation = (index or {}).get("generation", 0) + 1
+    file_name = f"{COMPACTED_PREFIX}{path_name}_g{generation}{writer.extension}"
+    tmp_path = os.path.join(directory, f".{file_name}")
+    with timed("compact_processed") as timer:
+        sink = writer.open(tmp_path, model_cls)
+        try:
+            batch = []
+            for row in merge_sorted(existing(), [(source_key(ts), loader(path)) for ts, path in sources]):
+                batch.append(row)
+                if len(batch) >= COMPACT_BATCH_SIZE:
+                    sink.write_rows(batch)
+                    batch = []
+            sink.write_rows(batch)
+            sink.close()
+        except Exception:
+            sink.close()
+            _remove(tmp_path)
+            raise
+        os.replace(tmp_path, os.path.join(directory, file_name))
+        _commit(directory, file_name, done | {ts for ts, _ in sources}, sink.rows, index)
+        timer.records = sink.rows
+    for _, path in sources:
+        _remove(path)
+    COMPACTED_FILES.labels("processed").inc(len(sources))
+    logger.info("Compacted %d file(s) of %s into %s (%d rows)", len(sources), directory, file_name, sink.rows)
+    return len(sources)
+
+
+def iter_compacted_raw(file_path: str):
+    """Yields (extraction_ts, records) for every snapshot of a compacted raw file, oldest first."""
+    with open_raw(file_path) as f:
+        for line in iter_raw_records(f, file_path):
+            yield line["extraction_ts"], line["records"]
+
+
+def compact_raw_partition(directory: str, prefix: str = RAW_FILE_PREFIX, is_processed=None, now: float = None,
+                          grace: float = COMPACT_GRACE_SECONDS) -> int:
+    """
+    Merges the raw snapshot files ({prefix}<ts><ext>) of one partition, and its previous compacted file,
+    into a new compacted ndjson.gz file. When is_processed(path, ts) is given, the partition is left
+    alone until it returns True for every raw file. Returns the number of source files merged.
+    """
+    now = time.time() if now is None else now
+    index = read_index(directory)
+    done = compacted_timestamps(directory)
+    sources = []
+    for name in os.listdir(directory):
+        parsed = split_raw_file_name(name, prefix)
+        if parsed is None:
+            continue
+        path = os.path.join(directory, name)
+        if parsed[0] in done:
+            _remove(path)
+        else:
+            sources.append((parsed[0], path))
+    if not sources or not _settled([path for _, path in sources], now, grace):
+        return 0
+    if is_processed is not None and not all(is_processed(path, ts) for ts, path in sources):
+        logger.info("Raw partition %s still has untransformed files; not compacting it yet.", directory)
+        return 0
+
+    def existing():
+        if index is not None:
+            for ts, records in iter_compacted_raw(os.path.join(directory, index["file"])):
+                yield ts, {"extraction_ts": ts, "records": records}
+
+    def loader(ts, path):
+        def load():
+            with open_raw(path) as f:
+                return [{"extraction_ts": ts, "records": list(iter_raw_records(f, path))}]
+        return load
+
+    generation = (index or {}).get("generation", 0) + 1
+    file_name = f"{COMPACTED_PREFIX}{prefix}g{generation}.{RAW_COMPACT_FORMAT}"
+    tmp_path = os.path.join(directory, f".{file_name}")
+    with timed("compact_raw") as timer:
+        try:
+            write_raw(merge_sorted(existing(), [(ts, loader(ts, path)) for ts, path in sources]), tmp_path, RAW_COMPACT_FORMAT)
+        except Exception:
+            _remove(tmp_path)
+            raise
+        os.replace(tmp_path, os.path.join(directory, file_name))
+        timestamps = done | {ts for ts, _ in sources}
+        _commit(directory, file_name, timestamps, len(timestamps), index)
+        timer.records = len(sources)
+    for _, path in sources:
+        _remove(path)
+    COMPACTED_FILES.labels("raw").inc(len(sources))
+    logger.info("Compacted %d raw file(s) of %s into %s", len(sources), directory, file_name)
+    return len(sources)
+
+
+def run_compaction(raw_dir: str = None, processed_dir: str = None, resources_dir: str = None, now: float = None,
+                   grace: float = COMPACT_GRACE_SECONDS) -> dict:
+    """
+    Compacts every closed partition of the processed models, the raw users snapshots (once transformed)
+    and the other extracted resources. Returns {"raw": files merged, "processed": files merged}.
+    """
+    from etl_pipeline import extractor, transform
+
+    raw_dir = raw_dir or transform.RAW_DIR
+    processed_dir = processed_dir or transform.PROCESSED_DIR
+    resources_dir = resources_dir or extractor.RESOURCES_DIR
+    now = time.time() if now is None else now
+    stats = {"raw": 0, "processed": 0}
+    backfill_commit_markers(processed_dir, transform.OUTPUT_MODEL_MAPPING.values())
+
+    def closed(date, hour, utc):
+        return partition_end(date, hour, utc) + grace <= now
+
+    for model_cls in transform.OUTPUT_MODEL_MAPPING.values():
+        for directory, date, hour in iter_partitions(os.path.join(processed_dir, model_cls.path_name)):
+            if closed(date, hour, utc=True):
+                stats["processed"] += _safely(compact_processed_partition, directory, model_cls, now=now, grace=grace)
+
+    def transformed(path, ts):
+        return is_committed(processed_dir, ts)
+
+    for directory, date, hour in iter_partitions(raw_dir):
+        if closed(date, hour, utc=False):
+            stats["raw"] += _safely(compact_raw_partition, directory, RAW_FILE_PREFIX, transformed, now=now, grace=grace)
+    for name, resource in extractor.RESOURCES.items():
+        if name == extractor.USERS:
+            continue
+        for directory, date, hour in iter_partitions(os.path.join(resources_dir, name)):
+            if closed(date, hour, utc=False):
+                stats["raw"] += _safely(compact_raw_partition, directory, resource.file_prefix, now=now, grace=grace)
+    return stats
+
+
+def _safely(compact, directory, *args, **kwargs) -> int:
+    """Runs one partition's compaction, logging (not raising) its failure so the other partitions still get compacted."""
+    try:
+        return compact(directory, *args, **kwargs)
+    except Exception as e:
+        logger.error("Compaction of %s failed: %s", directory, e)
+        return 0
+
+
+def run_compactor(interval: float = COMPACT_INTERVAL):
+    """Runs run_compaction every interval seconds."""
+    logger.info("Starting compactor (every %ss, grace %ss, %s output).", interval, COMPACT_GRACE_SECONDS, COMPACT_FORMAT)
+    while True:
+        stats = run_compaction()
+        logger.info("Compaction run merged %d raw and %d processed file(s).", stats["raw"], stats["processed"])
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    start_metrics_server(metrics_port("compactor"))
+    run_compactor()
@@ -1,40 +1,260 @@
-import requests
 import time
-import json
 import os
-import logging
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import urllib3
 
+from etl_pipeline.http_client import ExtractionClient
 from etl_pipeline.logger import get_logger
-from etl_pipeline.metrics import API_REQUESTS_SUCCESS, API_REQUESTS_FAILURE
-from etl_pipeline.models import User
+from etl_pipeline.metrics import API_REQUESTS_SUCCESS, API_REQUESTS_FAILURE, DATALAKE_WRITES, SNAPSHOTS_UNCHANGED, timed
+from etl_pipeline.metrics import RESOURCE_REQUESTS_SUCCESS, RESOURCE_REQUESTS_FAILURE, RESOURCE_INVALID_RECORDS
+from etl_pipeline.metrics import RESOURCE_DATALAKE_WRITES
+from etl_pipeline.models import User, Post, Comment, Album, Photo, Todo
+from etl_pipeline.raw_format import RAW_FILE_PREFIX, raw_file_name, write_raw
 
 logger = get_logger(__name__)
 
 # Disable warnings about unverified HTTPS requests (development only)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-API_URL = "https://jsonplaceholder.typicode.com/users"
+API_BASE_URL = os.getenv("API_BASE_URL", "https://jsonplaceholder.typicode.com")
+# The users endpoint keeps its own override, as the ingestor and the transformer are built around it.
+API_URL = os.getenv("API_URL", f"{API_BASE_URL}/users")
 
-def fetch_data():
+RAW_DIR = os.path.join("data", "raw")
+# Raw partitions of the other resources, one directory per resource (outside RAW_DIR, which the transformer consumes).
+RESOURCES_DIR = os.path.join("data", "resources")
+# Encoding of the raw datalake files, one of raw_format.RAW_FORMATS.
+RAW_FORMAT = os.getenv("RAW_FORMAT", "json")
+
+# HTTP client settings (seconds / counts).
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3.05"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "10"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "0.5"))
+API_BREAKER_THRESHOLD = int(os.getenv("API_BREAKER_THRESHOLD", "5"))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", "60"))
+
+
+USERS = "users"
+
+
+class Resource(namedtuple("Resource", ["name", "path", "model", "raw_dir", "file_prefix"])):
+    """
+    An API resource the extractor knows about: its endpoint path (under API_BASE_URL), the model
+    its records are validated with, and the raw partition root and file name prefix of its snapshots.
+    """
+
+    @property
+    def url(self) -> str:
+        return API_URL if self.name == USERS else f"{API_BASE_URL}{self.path}"
+
+
+def _resource(name: str, model) -> Resource:
+    return Resource(name, f"/{name}", model, os.path.join(RESOURCES_DIR, name), f"raw_{name}_")
+
+
+RESOURCES = {
+    USERS: Resource(USERS, "/users", User, RAW_DIR, RAW_FILE_PREFIX),
+    "posts": _resource("posts", Post),
+    "comments": _resource("comments", Comment),
+    "albums": _resource("albums", Album),
+    "photos": _resource("photos", Photo),
+    "todos": _resource("todos", Todo),
+}
+
+
+def parse_resource_names(value: str) -> list:
+    """Parses a comma separated list of RESOURCES names. Raises ValueError on an unknown name."""
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RESOURCES]
+    if unknown:
+        raise ValueError(f"Unknown resource(s) {', '.join(unknown)}; expected names among {', '.join(RESOURCES)}")
+    return names
+
+
+# Resources fetched by the ingestor every cycle (comma separated names of RESOURCES).
+EXTRACT_RESOURCES = parse_resource_names(os.getenv("EXTRACT_RESOURCES", ",".join(RESOURCES)))
+# Threads fetching resources concurrently (0 means one per resource).
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))
+
+_client = None
+
+def get_client() -> ExtractionClient:
+    """Returns the process-wide ExtractionClient, creating it on first use so the connection pool is reused across polls."""
+    global _client
+    if _client is None:
+        _client = ExtractionClient(
+            connect_timeout=API_CONNECT_TIMEOUT,
+            read_timeout=API_READ_TIMEOUT,
+            max_retries=API_MAX_RETRIES,
+            backoff_base=API_BACKOFF_BASE,
+            breaker_threshold=API_BREAKER_THRESHOLD,
+            breaker_reset=API_BREAKER_RESET,
+        )
+    return _client
+
+def _request(client: ExtractionClient, url: str, headers: dict = None, stage: str = "fetch"):
+    """GETs url (timed as stage). Returns the response if it is a 200 or 304, or None on failure."""
     try:
-        response = requests.get(API_URL, verify=False)
-        byte_size = len(response.content)
-        if response.status_code == 200:
-            logger.info(f"GET {API_URL} returned {response.status_code} with {byte_size} bytes")
-            API_REQUESTS_SUCCESS.inc()
-            return response.json()
-        else:
-            logger.error(f"GET {API_URL} failed with status {response.status_code} and {byte_size} bytes")
-            API_REQUESTS_FAILURE.inc()
-            return None
+        with timed(stage) as timer:
+            response = client.get(url, headers=headers)
+            byte_size = len(response.content)
+            timer.nbytes = byte_size
     except Exception as e:
-        logger.error(f"Error fetching data from {API_URL}: {e}")
+        logger.error(f"Error fetching data from {url}: {e}")
+        API_REQUESTS_FAILURE.inc()
+        return None
+    if response.status_code in (200, 304):
+        logger.info(f"GET {url} returned {response.status_code} with {byte_size} bytes")
+        API_REQUESTS_SUCCESS.inc()
+        return response
+    logger.error(f"GET {url} failed with status {response.status_code} and {byte_size} bytes")
+    API_REQUESTS_FAILURE.inc()
+    return None
+
+def _parse(response, url: str):
+    """Returns the JSON body of response, or None if it is not valid JSON."""
+    try:
+        return response.json()
+    except ValueError as e:
+        logger.error(f"Invalid JSON from {url}: {e}")
         API_REQUESTS_FAILURE.inc()
         return None
 
+def fetch_data(client: ExtractionClient = None, url: str = None):
+    """GETs the users endpoint (url, default API_URL) and returns the parsed JSON, or None on failure."""
+    url = url or API_URL
+    response = _request(client or get_client(), url)
+    if response is None or response.status_code != 200:
+        return None
+    return _parse(response, url)
+
+# Result of SnapshotFetcher.fetch: data is None when the snapshot is unchanged (changed=False).
+Snapshot = namedtuple("Snapshot", ["data", "changed", "etag", "last_modified", "payload_hash"])
+
+class SnapshotFetcher:
+    """
+    Fetches a resource (users by default, see RESOURCES) and tells whether the snapshot changed
+    since the last accepted one.
+    Requests are conditional (If-None-Match / If-Modified-Since) when the API sent an ETag or
+    Last-Modified header, and a 304 is reported as unchanged. Otherwise the payload bytes are
+    hashed and a body identical to the previous one is reported as unchanged, without parsing it.
+    The validators and the hash only move forward once the caller accept()s a snapshot, so a
+    snapshot that failed to be stored is fetched again as changed.
+    """
+
+    def __init__(self, client: ExtractionClient = None, url: str = None, resource: str = USERS):
+        self.client = client
+        self.url = url
+        parse_resource_names(resource)  # validate the name
+        self.resource = RESOURCES[resource]
+        self.etag = None
+        self.last_modified = None
+        self.payload_hash = None
+        # Number of records in the last accepted snapshot.
+        self.records = 0
+
+    def fetch(self):
+        """Returns a Snapshot, or None if the request failed."""
+        name = self.resource.name
+        url = self.url or self.resource.url
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        response = _request(self.client or get_client(), url, headers, stage=f"fetch_{name}")
+        if response is None:
+            RESOURCE_REQUESTS_FAILURE.labels(name).inc()
+            return None
+        if response.status_code == 304:
+            RESOURCE_REQUESTS_SUCCESS.labels(name).inc()
+            SNAPSHOTS_UNCHANGED.labels(name, "not_modified").inc()
+            return Snapshot(None, False, self.etag, self.last_modified, self.payload_hash)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        payload_hash = hashlib.sha256(response.content).hexdigest()
+        if payload_hash == self.payload_hash:
+            RESOURCE_REQUESTS_SUCCESS.labels(name).inc()
+            SNAPSHOTS_UNCHANGED.labels(name, "payload_hash").inc()
+            return Snapshot(None, False, etag, last_modified, payload_hash)
+        data = _parse(response, url)
+        if data is None:
+            RESOURCE_REQUESTS_FAILURE.labels(name).inc()
+            return None
+        RESOURCE_REQUESTS_SUCCESS.labels(name).inc()
+        return Snapshot(data, True, etag, last_modified, payload_hash)
+
+    def accept(self, snapshot: Snapshot):
+        """Makes snapshot the reference for the next fetch (call once it has been saved and ingested)."""
+        self.etag = snapshot.etag
+        self.last_modified = snapshot.last_modified
+        self.payload_hash = snapshot.payload_hash
+        if snapshot.data is not None:
+            self.records = len(snapshot.data)
+
+def fetch_resources(fetchers: dict, executor: ThreadPoolExecutor = None, store=None) -> dict:
+    """
+    Fetches every resource of fetchers ({name: SnapshotFetcher}) concurrently on executor (a
+    temporary thread pool with one thread per resource by default). When store(fetcher, snapshot)
+    is given it is called in the same thread for each snapshot, so storing a large resource overlaps
+    with fetching the others. Returns {name: Snapshot or None}, or {name: store's result} with store.
+    """
+    def run(fetcher):
+        snapshot = fetcher.fetch()
+        return store(fetcher, snapshot) if store is not None else snapshot
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(fetchers)), thread_name_prefix="extract")
+    try:
+        futures = {name: executor.submit(run, fetcher) for name, fetcher in fetchers.items()}
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+def validate_records(resource: Resource, data) -> int:
+    """Validates raw records with the resource's model. Returns the number of invalid records (logged and counted)."""
+    invalid = 0
+    with timed(f"validate_{resource.name}") as timer:
+        for record in data:
+            try:
+                resource.model(**record)
+            except Exception as e:
+                invalid += 1
+                logger.warning("Validation error for %s record %s: %s", resource.name, record.get("id", "unknown"), e)
+        timer.records = len(data)
+    if invalid:
+        RESOURCE_INVALID_RECORDS.labels(resource.name).inc(invalid)
+    return invalid
+
+def store_resource_snapshot(fetcher: SnapshotFetcher, snapshot: Snapshot, extraction_ts: int):
+    """
+    Stores a changed snapshot of a non-users resource: validates it (invalid records are counted but
+    kept, the raw layer holds what the API returned) and saves it to the resource's raw partition,
+    then accepts it. Returns the raw file path, True for an unchanged snapshot and None on failure.
+    """
+    resource = fetcher.resource
+    if snapshot is None or (snapshot.changed and not isinstance(snapshot.data, list)):
+        logger.error("No %s data fetched from API.", resource.name)
+        return None
+    if not snapshot.changed:
+        fetcher.accept(snapshot)
+        return True
+    validate_records(resource, snapshot.data)
+    file_path = save_raw_data(snapshot.data, extraction_ts, resource.raw_dir, prefix=resource.file_prefix)
+    if file_path:
+        RESOURCE_DATALAKE_WRITES.labels(resource.name).inc()
+        fetcher.accept(snapshot)
+    return file_path
+
 
+@timed("validate")
 def validate_data(data, extraction_ts: int = 0):
     valid_users = []
     for record in data:
@@ -43,24 +263,36 @@ def validate_data(data, extraction_ts: int = 0):
             user = User.from_api(record, extraction_ts)
             valid_users.append(user)
         except Exception as e:
-            logging.warning(f"Validation error for record {record.get('id', 'unknown')}: {e}")
+            logger.warning("Validation error for record %s: %s", record.get("id", "unknown"), e)
     return valid_users
 
-def save_raw_data(data, extraction_ts: int) -> str:
+def save_raw_data(data, extraction_ts: int, raw_dir: str = None, fmt: str = None, prefix: str = RAW_FILE_PREFIX) -> str:
+    """
+    Writes a snapshot to raw_dir/YYYY-MM-DD/HH/{prefix}{extraction_ts}<ext> (raw_data_ for users),
+    encoded with fmt (default RAW_FORMAT; see raw_format.RAW_FORMATS). Returns the file path, or None on failure.
+    The file is written under its dot-prefixed name and renamed into place once complete,
+    so the transformer never sees a partially written raw file.
+    """
+    fmt = fmt or RAW_FORMAT
     date_path = datetime.fromtimestamp(extraction_ts).strftime("%Y-%m-%d/%H")
-    dir_path = os.path.join("data", "raw", date_path)
+    dir_path = os.path.join(raw_dir or RAW_DIR, date_path)
     os.makedirs(dir_path, exist_ok=True)
-    file_path = os.path.join(dir_path, f"raw_data_{extraction_ts}.json")
+    file_name = raw_file_name(extraction_ts, fmt, prefix)
+    file_path = os.path.join(dir_path, file_name)
+    tmp_path = os.path.join(dir_path, f".{file_name}")
     try:
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=2)
-        file_size = os.path.getsize(file_path)
+        with timed("raw_write") as timer:
+            write_raw(data, tmp_path, fmt)
+            os.replace(tmp_path, file_path)
+            file_size = os.path.getsize(file_path)
+            timer.records, timer.nbytes = len(data), file_size
         logger.info(f"Saved raw data to {file_path} (Partition: {date_path}, {file_size} bytes)")
-        from etl_pipeline.metrics import DATALAKE_WRITES
         DATALAKE_WRITES.inc()
         return file_path
     except Exception as e:
         logger.error(f"Failed to save raw data to {file_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
 
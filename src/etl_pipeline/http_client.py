@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from etl_pipeline.logger import get_logger
+from etl_pipeline.metrics import API_RETRIES, API_REQUEST_LATENCY, API_CIRCUIT_OPEN
+
+logger = get_logger(__name__)
+
+# Status codes worth retrying: throttling and transient server-side errors.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Transport errors worth retrying, including bodies cut short by the server or the network.
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is short-circuited because the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker, safe to share between threads.
+      - closed: requests flow; consecutive failures are counted.
+      - open: after failure_threshold consecutive failures, requests are rejected
+        until reset_timeout seconds have passed.
+      - half_open: a single trial request is let through (concurrent ones are rejected
+        while it is in flight); success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open" or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.trial = False
+                logger.warning("Circuit breaker opened after %d consecutive failure(s)", self.failures)
+
+
+class ExtractionClient:
+    """
+    Reusable HTTP client for the extractor.
+    Keeps a pooled keep-alive requests.Session (so consecutive polls reuse the TCP/TLS connection),
+    negotiates gzip/deflate, applies connect/read timeouts and retries transient failures with
+    exponential backoff and full jitter. A CircuitBreaker per endpoint (scheme, host and path) stops
+    hammering an endpoint that keeps failing without blocking the others fetched concurrently.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_maxsize: int = 10,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 60.0,
+        verify: bool = False,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        # endpoint -> CircuitBreaker
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()
+        self.session = requests.Session()
+        # Retries are handled here (with metrics), not by urllib3.
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session.verify = verify
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform(0, min(backoff_max, backoff_base * 2**attempt))."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Returns the CircuitBreaker of url's endpoint, creating it on first use."""
+        parts = urlsplit(url)
+        endpoint = (parts.scheme, parts.netloc, parts.path)
+        with self.breakers_lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = self.breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return breaker
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GETs url, retrying RETRYABLE_ERRORS (connection errors, timeouts, truncated bodies) and RETRYABLE_STATUS responses.
+        Returns the last response received (which may still be an error status once retries are
+        exhausted) or raises the last connection error. Raises CircuitOpenError without sending
+        anything while the endpoint's breaker is open.
+        """
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            API_CIRCUIT_OPEN.inc()
+            raise CircuitOpenError(f"Circuit breaker is open; skipping GET {url}")
+        try:
+            response, error = self._get_with_retries(url, **kwargs)
+        except Exception:
+            breaker.record_failure()
+            raise
+        if response is not None and response.status_code not in RETRYABLE_STATUS:
+            breaker.record_success()
+            return response
+        breaker.record_failure()
+        if response is not None:
+            return response
+        raise error
+
+    def _get_with_retries(self, url: str, **kwargs):
+        """Returns (last response or None, last retryable error or None) of up to max_retries + 1 attempts."""
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+                error = None
+            except RETRYABLE_ERRORS as e:
+                response = None
+                error = e
+            API_REQUEST_LATENCY.observe(time.perf_counter() - start)
+
+            if response is not None and response.status_code not in RETRYABLE_STATUS:
+                break
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff(attempt)
+            reason = error if error is not None else f"status {response.status_code}"
+            logger.warning("GET %s attempt %d failed (%s); retrying in %.2fs", url, attempt + 1, reason, delay)
+            API_RETRIES.inc()
+            time.sleep(delay)
+        return response, error
+
+    def close(self):
+        self.session.close()
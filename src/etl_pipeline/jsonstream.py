@@ -0,0 +1,73 @@
+import json
+import re
+
+# Read size used when streaming a raw file.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(fp, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Incrementally yields the elements of a top-level JSON array read from the text file object fp.
+    Only the current element (plus at most one read chunk) is held in memory, so a raw snapshot can
+    be processed in constant memory regardless of its size.
+    Raises ValueError (json.JSONDecodeError for malformed elements) if the input is not a JSON array.
+    """
+    buf = ""
+    pos = 0
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        # Drop the consumed prefix so the buffer never grows beyond one element plus one chunk.
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or not read_more():
+                return
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == "]":
+        return
+
+    while True:
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # The element is most likely cut by the chunk boundary: read more and retry.
+                if eof or not read_more():
+                    raise
+                continue
+            # A scalar ending exactly at the buffer end (e.g. a number) may continue in the next chunk.
+            if end == len(buf) and not eof and read_more():
+                continue
+            break
+        pos = end
+        yield value
+
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON array")
+        separator = buf[pos]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {separator!r}")
+        skip_whitespace()
@@ -0,0 +1,226 @@
+"""
+Local load test for the extraction path.
+
+StandInAPI serves generated JSONPlaceholder-shaped users over HTTP with injectable latency,
+error rate, truncated bodies and slow chunked streaming; run_load_test drives
+fetch_data -> save_raw_data -> ingest_snapshot against it and reports latency percentiles
+and sustained snapshots/min.
+
+    python -m etl_pipeline.loadtest --users 10000 --snapshots 50 --error-rate 0.1 --truncate-rate 0.05
+    python -m etl_pipeline.loadtest --serve --users 1000   # then run the ingestor with API_URL=<printed url>
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from etl_pipeline.logger import get_logger
+from etl_pipeline.synthetic import generate_users
+
+logger = get_logger(__name__)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        api = self.server.api
+        if api.latency:
+            time.sleep(api.latency)
+        truncated = False
+        # Requests are served by concurrent threads: the counters are updated with the rng, under the lock.
+        with api.lock:
+            roll = api.rng.random()
+            api.requests += 1
+            if roll < api.error_rate:
+                api.errors_served += 1
+            elif roll < api.error_rate + api.truncate_rate:
+                api.truncated_served += 1
+                truncated = True
+        if roll < api.error_rate:
+            body = b'{"error": "injected failure"}'
+            self.send_response(500)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        body = api.payload
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if truncated:
+            # Announce the full length but close the connection halfway through the body.
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.end_headers()
+        for start in range(0, len(body), api.chunk_size):
+            self.wfile.write(body[start:start + api.chunk_size])
+            if api.chunk_delay:
+                time.sleep(api.chunk_delay)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInAPI:
+    """
+    Local stand-in for the JSONPlaceholder users endpoint, served from a background thread.
+      - users/seed: size and content of the generated payload (etl_pipeline.synthetic)
+      - latency: seconds to wait before answering each request
+      - error_rate: probability of answering 500
+      - truncate_rate: probability of closing the connection halfway through the body
+      - chunk_size/chunk_delay: slow streaming, the body is written chunk_size bytes at a time
+    """
+
+    def __init__(self, users=10, seed=0, latency=0.0, error_rate=0.0, truncate_rate=0.0,
+                 chunk_size=64 * 1024, chunk_delay=0.0, host="127.0.0.1", port=0):
+        self.payload = json.dumps(generate_users(users, seed)).encode()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors_served = 0
+        self.truncated_served = 0
+        self.server = ThreadingHTTPServer((host, port), _StandInHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/users"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """Nearest-rank percentiles of values, as {"p50": ..., ...} (None when values is empty)."""
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        if not ordered:
+            result[f"p{point}"] = None
+            continue
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = ordered[rank - 1]
+    return result
+
+
+def run_load_test(api: StandInAPI, snapshots: int = 20, raw_dir: str = None, database_url: str = "sqlite://",
+                  bulk: bool = True, client=None) -> dict:
+    """
+    Runs snapshots extraction cycles (fetch_data -> save_raw_data -> ingest_snapshot) back to back
+    against api, with raw files under raw_dir (a temporary directory by default) and the database at
+    database_url. Returns per-step latency percentiles (seconds), failures and snapshots/min.
+    """
+    from sqlmodel import Session, SQLModel
+    from etl_pipeline.extractor import fetch_data, save_raw_data
+    from etl_pipeline.ingestor import ingest_snapshot, make_engine
+
+    engine = make_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    timings = {"fetch": [], "save": [], "ingest": [], "total": []}
+    failures = 0
+    base_ts = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp_dir, Session(engine) as session:
+        started = time.perf_counter()
+        for i in range(snapshots):
+            cycle_start = time.perf_counter()
+            data = fetch_data(client, api.url)
+            timings["fetch"].append(time.perf_counter() - cycle_start)
+            if not data:
+                failures += 1
+                continue
+            # Distinct timestamps, as back-to-back cycles can share a second.
+            extraction_ts = base_ts + i
+            step = time.perf_counter()
+            file_path = save_raw_data(data, extraction_ts, raw_dir or tmp_dir)
+            timings["save"].append(time.perf_counter() - step)
+            if not file_path:
+                failures += 1
+                continue
+            step = time.perf_counter()
+            try:
+                ingest_snapshot(session, data, extraction_ts, bulk)
+            except Exception as e:
+                logger.error("Load test ingest failed: %s", e)
+                session.rollback()
+                failures += 1
+                continue
+            timings["ingest"].append(time.perf_counter() - step)
+            timings["total"].append(time.perf_counter() - cycle_start)
+        elapsed = time.perf_counter() - started
+
+    succeeded = len(timings["total"])
+    return {
+        "snapshots": snapshots,
+        "succeeded": succeeded,
+        "failed": failures,
+        "payload_bytes": len(api.payload),
+        "requests_served": api.requests,
+        "errors_injected": api.errors_served,
+        "truncations_injected": api.truncated_served,
+        "elapsed_seconds": elapsed,
+        "snapshots_per_min": succeeded / elapsed * 60 if elapsed > 0 else None,
+        "latency_seconds": {name: percentiles(values) for name, values in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the extractor against a local stand-in users API.")
+    parser.add_argument("--users", type=int, default=10, help="Users per payload.")
+    parser.add_argument("--snapshots", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between body chunks.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--database-url", default="sqlite://")
+    parser.add_argument("--orm", action="store_true", help="Ingest with per-record ORM adds instead of bulk inserts.")
+    parser.add_argument("--serve", action="store_true", help="Only run the stand-in API until interrupted.")
+    args = parser.parse_args()
+
+    api = StandInAPI(args.users, args.seed, args.latency, args.error_rate, args.truncate_rate,
+                     args.chunk_size, args.chunk_delay, port=args.port)
+    with api:
+        if args.serve:
+            print(f"Serving {args.users} users at {api.url}", flush=True)
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return
+        report = run_load_test(api, args.snapshots, database_url=args.database_url, bulk=not args.orm)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,226 @@
+import atexit
+import json
 import logging
+import multiprocessing.util
 import os
+import queue
+import threading
 import time
+from logging.handlers import QueueHandler, QueueListener
+
+from etl_pipeline.metrics import LOG_RECORDS_DROPPED
+
+# Logging configuration, from the environment:
+#   LOG_LEVEL          level of the etl_pipeline loggers (records below it cost a single level check)
+#   LOG_CONSOLE_LEVEL  level of the console output
+#   LOG_FILE_LEVEL     level of the log file output
+#   LOG_FORMAT         console format, "text" or "json"
+#   LOG_FILE_FORMAT    file format, "text" or "json"
+#   LOG_FILE           path of the log file ("" to disable it)
+#   LOG_RATE_LIMIT     records per second allowed from each logging call site below WARNING (0 disables)
+#   LOG_QUEUE_SIZE     records buffered for the background writer; when it is full, further records below
+#                      WARNING are dropped (counted in log_records_dropped), the others are still queued
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_CONSOLE_LEVEL = os.getenv("LOG_CONSOLE_LEVEL", "INFO").upper()
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_FILE_FORMAT = os.getenv("LOG_FILE_FORMAT", "json")
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "etl.log"))
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "50"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes into the JSON output.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line: ts, level, logger, message, extra= fields and exc_info."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most rate records per second through from each logging call site (logger and line),
+    so a per-record message in a hot loop costs one dict lookup once its budget is spent.
+    Records at or above min_level always pass. The first record let through after some were
+    dropped carries their number in its "suppressed" attribute.
+    """
+
+    def __init__(self, rate: float, min_level: int = logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        self.min_level = min_level
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= self.min_level:
+            return True
+        key = (record.name, record.lineno)
+        now = record.created
+        with self.lock:
+            window, allowed, suppressed = self.sites.get(key, (now, 0, 0))
+            if now - window >= 1.0:
+                window, allowed = now, 0
+            if allowed >= self.rate:
+                self.sites[key] = (window, allowed, suppressed + 1)
+                return False
+            self.sites[key] = (window, allowed + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never stalls the caller. log_queue is expected to be a queue.SimpleQueue, whose
+    put costs a fraction of queue.Queue's; maxsize (0 for no limit) bounds it instead: past it, records
+    below WARNING are dropped and counted (in dropped and the log_records_dropped metric), while
+    warnings and errors are always enqueued. The number of dropped records is reported by a warning
+    queued ahead of the next record that fits.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def __init__(self, log_queue, maxsize: int = 0):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.unreported = 0
+
+    def prepare(self, record):
+        # Only freeze what may change after the call returns (the message arguments, the traceback);
+        # formatting is left to the listener thread and the record is not copied.
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        # Called from handle(), under the handler's lock.
+        if record.levelno < logging.WARNING and self.maxsize and self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            self.unreported += 1
+            LOG_RECORDS_DROPPED.inc()
+            return
+        if self.unreported:
+            self.report_dropped()
+        self.queue.put_nowait(record)
+
+    def report_dropped(self):
+        """Queues a warning with the number of records dropped since the last one."""
+        self.queue.put_nowait(logging.makeLogRecord({
+            "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": f"Dropped {self.unreported} log record(s): the log queue was full", "dropped": self.unreported,
+        }))
+        self.unreported = 0
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+    formatter.converter = time.gmtime
+    return formatter
+
+
+def build_handlers(log_file: str = LOG_FILE) -> list:
+    """The output handlers (console, and the log file unless log_file is empty) the background listener writes to."""
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(LOG_CONSOLE_LEVEL)
+    console_handler.setFormatter(_formatter(LOG_FORMAT))
+    handlers = [console_handler]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setLevel(LOG_FILE_LEVEL)
+        file_handler.setFormatter(_formatter(LOG_FILE_FORMAT))
+        handlers.append(file_handler)
+    return handlers
+
+
+_queue_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _shared_queue_handler() -> DroppingQueueHandler:
+    """
+    Returns the process-wide queue handler, starting its listener thread on first use.
+    Callers only pay for filtering and enqueueing; formatting and I/O happen on the listener thread.
+    """
+    global _queue_handler, _listener
+    with _lock:
+        if _queue_handler is None:
+            handler = DroppingQueueHandler(queue.SimpleQueue(), LOG_QUEUE_SIZE)
+            handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT))
+            _listener = QueueListener(handler.queue, *build_handlers(), respect_handler_level=True)
+            _listener.start()
+            atexit.register(shutdown_logging)
+            _queue_handler = handler
+    return _queue_handler
+
+
+def _reinit_after_fork():
+    """
+    fork() copies the queue handler, which every logger of the child still holds, but not the listener
+    thread draining it. Gives the child (e.g. a transformer worker) a fresh queue and its own listener,
+    flushed when the child exits (worker processes leave through os._exit, so atexit handlers do not run).
+    """
+    global _listener, _lock
+    _lock = threading.Lock()
+    _listener = None
+    if _queue_handler is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _queue_handler.unreported = 0  # reported by the parent
+    _listener = QueueListener(_queue_handler.queue, *build_handlers(), respect_handler_level=True)
+    _listener.start()
+    multiprocessing.util.Finalize(None, shutdown_logging, exitpriority=100)
+
+
+os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+def shutdown_logging():
+    """Reports the dropped records not reported yet, flushes the queue and stops the listener thread (registered with atexit)."""
+    global _listener
+    if _listener is not None:
+        if _queue_handler.unreported:
+            with _queue_handler.lock:
+                _queue_handler.report_dropped()
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 
 def get_logger(name: str = __name__) -> logging.Logger:
     """
-    Returns a configured logger that writes logs to both the console
-    and a file at logs/etl.log.
+    Returns a logger at LOG_LEVEL that hands its records to the shared background queue,
+    which writes them to the console and to LOG_FILE (logs/etl.log by default).
     """
-    # Ensure the logs directory exists
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    
+    logger.setLevel(LOG_LEVEL)
+    handler = _shared_queue_handler()
     # Avoid duplicate handlers if logger is already configured
-    if not logger.handlers:
-        # File handler: logs everything at DEBUG level and above
-        file_handler = logging.FileHandler(os.path.join(log_dir, "etl.log"))
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Console handler: logs INFO level and above
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        formatter = logging.Formatter(
-            fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
-        formatter.converter = time.gmtime
-        
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-    
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
     return logger
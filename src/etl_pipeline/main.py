@@ -1,23 +1,84 @@
+import time
+
+# Startup time is measured from here, before anything else is imported.
+_STARTED = time.perf_counter()
+
 import argparse
 import sys
 import atexit
 import signal
 from etl_pipeline.logger import get_logger
-from etl_pipeline.metrics import SERVICE_ERRORS, APP_STARTS
-from etl_pipeline.ingestor import run_ingestor
-from etl_pipeline.transform import default_transformation_fn, run_transformer
+from etl_pipeline.metrics import SERVICE_ERRORS, APP_STARTS, STARTUP_SECONDS, metrics_port, start_metrics_server
 
 logger = get_logger(__name__)
 service_error_flag = False
 
+def load_mode(args):
+    """
+    Imports only what the selected mode needs and returns a function running it: the transformer and
+    the compactor never import the ingestor (SQLAlchemy engine, database driver), and vice versa.
+    """
+    if args.mode in ("ingestor", "replay"):
+        from etl_pipeline.ingestor import run_ingestor, run_replay
+        if args.mode == "replay":
+            return lambda: run_replay(bulk=args.bulk)
+        return lambda: run_ingestor(bulk=args.bulk, cdc=args.cdc)
+    if args.mode == "transformer":
+        from etl_pipeline.transform import TRANSFORM_WATCH, default_batch_transformation_fn, default_transformation_fn
+        from etl_pipeline.transform import run_transformer, set_output_format
+        if args.output_format:
+            set_output_format(args.output_format)
+        return lambda: run_transformer(
+            default_transformation_fn,
+            workers=args.workers,
+            batch_fn=default_batch_transformation_fn,
+            watch=args.watch or TRANSFORM_WATCH,
+        )
+    from etl_pipeline.compactor import run_compactor
+    return run_compactor
+
 def main():
     global service_error_flag
     parser = argparse.ArgumentParser(description="ETL Pipeline Main Entrypoint")
     parser.add_argument(
         '--mode',
-        choices=['ingestor', 'transformer'],
+        choices=['ingestor', 'transformer', 'compactor', 'replay'],
         default='ingestor',
-        help="Mode to run the application: 'ingestor' for data ingestion or 'transformer' for data transformation."
+        help="Mode to run the application: 'ingestor' for data ingestion, 'transformer' for data transformation, "
+             "'compactor' for hourly compaction of closed datalake partitions or 'replay' to retry the "
+             "ingestor's dead-lettered records once."
+    )
+    parser.add_argument(
+        '--bulk',
+        action='store_true',
+        help="Ingestor and replay modes only: write each snapshot with set-based bulk inserts instead of per-record ORM adds."
+    )
+    parser.add_argument(
+        '--cdc',
+        action='store_true',
+        help="Ingestor mode only: only insert new or changed users, tracked as SCD type 2 versions."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Transformer mode only: number of worker processes transforming raw files in parallel."
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=['csv', 'colz', 'parquet'],
+        help="Transformer mode only: output format for every processed model (defaults to OUTPUT_FORMAT or csv)."
+    )
+    parser.add_argument(
+        '--watch',
+        choices=['auto', 'inotify', 'poll'],
+        help="Transformer mode only: how new raw files are noticed (defaults to TRANSFORM_WATCH or auto)."
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help="Port of the Prometheus metrics server (defaults to METRICS_PORT_<MODE> or the mode's port in "
+             "metrics.METRICS_PORTS; 0 disables it)."
     )
     args = parser.parse_args()
     
@@ -25,10 +86,12 @@ def main():
     logger.info("ETL Application started in %s mode.", args.mode)
     
     try:
-        if args.mode == "ingestor":
-            run_ingestor()
-        elif args.mode == "transformer":
-            run_transformer(default_transformation_fn)
+        run = load_mode(args)
+        start_metrics_server(metrics_port(args.mode) if args.metrics_port is None else args.metrics_port)
+        startup = time.perf_counter() - _STARTED
+        STARTUP_SECONDS.labels(args.mode).set(startup)
+        logger.info("Started %s mode in %.0f ms.", args.mode, startup * 1000)
+        run()
     except Exception as e:
         service_error_flag = True
         logger.error("Unhandled exception in %s mode: %s", args.mode, e)
@@ -0,0 +1,143 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from fnmatch import fnmatch
+
+from etl_pipeline.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Processing status of a raw file.
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Raw partitions are laid out as <raw_dir>/YYYY-MM-DD/HH.
+_DATE_DIR = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_HOUR_DIR = re.compile(r"^\d{2}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw_files (
+    raw_file TEXT PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    outputs TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS raw_files_status ON raw_files (status, ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Manifest:
+    """
+    Persistent processing manifest: a small SQLite index mapping each raw file to its
+    output files and processing status (pending / done / failed).
+
+    New raw files are discovered by listing only the most recent raw partitions: the manifest keeps
+    a watermark partition and each discover() lists partitions from the watermark onwards, then moves
+    the watermark to the second newest partition seen (so files landing around an hour boundary are
+    still picked up). Finding work therefore costs O(files in the latest partitions), not O(datalake).
+
+    If the database file does not exist yet, is_new is True and the caller is expected to rebuild
+    the statuses from what is on disk (see transform.get_unprocessed_raw_files).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+        if self.is_new:
+            logger.info("Created new processing manifest at %s", path)
+
+    def _get_meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _partitions_since(self, raw_dir: str, watermark):
+        """Yields (directory, "YYYY-MM-DD/HH") for every raw partition at or after the watermark, in order."""
+        since = tuple(watermark.split("/")) if watermark else None
+        try:
+            dates = sorted(d for d in os.listdir(raw_dir) if _DATE_DIR.match(d))
+        except FileNotFoundError:
+            return
+        for date in dates:
+            if since and date < since[0]:
+                continue
+            date_dir = os.path.join(raw_dir, date)
+            hours = sorted(h for h in os.listdir(date_dir) if _HOUR_DIR.match(h))
+            for hour in hours:
+                if since and (date, hour) < since:
+                    continue
+                yield os.path.join(date_dir, hour), f"{date}/{hour}"
+
+    def discover(self, raw_dir: str, pattern: str, parse_ts) -> int:
+        """
+        Registers raw files matching pattern (an fnmatch pattern on the file name) that appeared since
+        the watermark, plus any files directly under raw_dir. parse_ts(path) returns the file's epoch
+        timestamp or None. Returns the number of newly registered files.
+        """
+        directories = [raw_dir]
+        partitions = []
+        for directory, partition in self._partitions_since(raw_dir, self._get_meta("raw_watermark")):
+            directories.append(directory)
+            partitions.append(partition)
+
+        now = time.time()
+        rows = []
+        for directory in directories:
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if not fnmatch(name, pattern):
+                    continue
+                path = os.path.join(directory, name)
+                ts = parse_ts(path)
+                if ts is not None:
+                    rows.append((path, ts, PENDING, now))
+
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO raw_files (raw_file, ts, status, updated_at) VALUES (?, ?, ?, ?)", rows
+        )
+        added = max(cursor.rowcount, 0)
+        if partitions:
+            self._set_meta("raw_watermark", partitions[-2] if len(partitions) > 1 else partitions[-1])
+        self.conn.commit()
+        if added:
+            logger.info("Registered %d new raw file(s) in the manifest.", added)
+        return added
+
+    def pending(self):
+        """Returns [(raw_file, ts)] for every raw file that is not done yet, oldest first."""
+        return self.conn.execute(
+            "SELECT raw_file, ts FROM raw_files WHERE status != ? ORDER BY ts", (DONE,)
+        ).fetchall()
+
+    def mark(self, raw_file: str, ts: int, status: str, outputs=()):
+        """Records the processing status and output files of a raw file."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO raw_files (raw_file, ts, status, outputs, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (raw_file, ts, status, json.dumps(list(outputs)), time.time()),
+        )
+        self.conn.commit()
+
+    def status(self, raw_file: str):
+        row = self.conn.execute("SELECT status FROM raw_files WHERE raw_file = ?", (raw_file,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()
@@ -1,4 +1,9 @@
-from prometheus_client import Counter, start_http_server
+import os
+import time
+from collections.abc import Sized
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
 API_REQUESTS_SUCCESS = Counter("api_requests_success", "Number of successful API requests")
 API_REQUESTS_FAILURE = Counter("api_requests_failure", "Number of failed API requests")
@@ -11,10 +16,127 @@ DB_CONNECTIONS = Counter("db_connections", "Number of times a connection to the
 DATALAKE_WRITES = Counter("datalake_writes", "Number of datalake file writes")
 TRANSFORM_SUCCESS = Counter("transform_success", "Number of successfully transformed raw files")
 TRANSFORM_FAILURE = Counter("transform_failure", "Number of raw files that failed to transform")
+API_RETRIES = Counter("api_retries", "Number of API request retries")
+API_CIRCUIT_OPEN = Counter("api_circuit_open", "Number of API requests short-circuited by the open circuit breaker")
+API_REQUEST_LATENCY = Histogram("api_request_latency_seconds", "Latency of individual API request attempts in seconds")
+
+# Per-stage instrumentation, labelled by stage name (see timed).
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds", "Duration of pipeline stages in seconds", ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+STAGE_ERRORS = Counter("stage_errors", "Number of pipeline stage runs that raised", ["stage"])
+STAGE_RECORDS = Counter("stage_records", "Number of records handled by pipeline stages", ["stage"])
+STAGE_RECORDS_PER_SECOND = Gauge("stage_records_per_second", "Records/s of the last run of each pipeline stage", ["stage"])
+PAYLOAD_BYTES = Histogram(
+    "payload_bytes", "Size in bytes of payloads handled by pipeline stages", ["stage"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+)
+RESOURCE_REQUESTS_SUCCESS = Counter("resource_requests_success", "Number of successful API requests per resource", ["resource"])
+RESOURCE_REQUESTS_FAILURE = Counter("resource_requests_failure", "Number of failed API requests per resource", ["resource"])
+RESOURCE_INVALID_RECORDS = Counter(
+    "resource_invalid_records", "Number of extracted records failing their resource model validation", ["resource"]
+)
+RESOURCE_DATALAKE_WRITES = Counter("resource_datalake_writes", "Number of raw datalake file writes per resource", ["resource"])
+SNAPSHOTS_UNCHANGED = Counter(
+    "snapshots_unchanged", "Number of API snapshots skipped as unchanged, by resource and detection method",
+    ["resource", "reason"]
+)
+INGEST_POLL_INTERVAL = Gauge("ingest_poll_interval_seconds", "Current wait of the ingestor before its next API poll")
+DEAD_LETTERS = Counter("dead_letters", "Number of raw user records the ingestor moved to the dead-letter table")
+DEAD_LETTERS_REPLAYED = Counter("dead_letters_replayed", "Number of dead-lettered records inserted by a replay")
+COMPACTED_FILES = Counter("compacted_files", "Number of snapshot files merged into compacted partition files", ["layer"])
+LOG_RECORDS_DROPPED = Counter("log_records_dropped", "Number of log records dropped because the log queue was full")
+STARTUP_SECONDS = Gauge("startup_seconds", "Seconds main took to reach the service loop, by mode", ["mode"])
+TRANSFORM_BACKLOG_FILES = Gauge("transform_backlog_files", "Number of raw files waiting to be transformed")
+TRANSFORM_BACKLOG_AGE = Gauge(
+    "transform_backlog_oldest_age_seconds", "Age of the oldest raw file waiting to be transformed (0 when none)"
+)
+
+
+def observe_stage(stage: str, seconds: float, records: int = None, nbytes: int = None, failed: bool = False):
+    """Records one run of a pipeline stage: its duration and, when known, its record count, records/s and payload size."""
+    STAGE_DURATION.labels(stage).observe(seconds)
+    if failed:
+        STAGE_ERRORS.labels(stage).inc()
+        return
+    if records is not None:
+        STAGE_RECORDS.labels(stage).inc(records)
+        if seconds > 0:
+            STAGE_RECORDS_PER_SECOND.labels(stage).set(records / seconds)
+    if nbytes is not None:
+        PAYLOAD_BYTES.labels(stage).observe(nbytes)
+
+
+class timed:
+    """
+    Times a pipeline stage, as a context manager or a decorator:
+
+        with timed("raw_write") as timer:
+            ...
+            timer.records, timer.nbytes = len(data), size
+
+        @timed("validate")
+        def validate_data(data): ...
+
+    On exit the duration, records and bytes are recorded with observe_stage (a raised exception
+    counts in stage_errors instead), and timer.seconds holds the duration. As a decorator, every
+    call gets its own timer (so concurrent calls do not share one) whose records is the length of
+    the returned value, when it has one.
+    With observe=False nothing is recorded, for code running in worker processes whose
+    results are reported to the parent (which then calls observe_stage itself).
+    """
+
+    def __init__(self, stage: str, observe: bool = True):
+        self.stage = stage
+        self.observe = observe
+        self.records = None
+        self.nbytes = None
+        self.seconds = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self.records = None
+        self.nbytes = None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        if self.observe:
+            observe_stage(self.stage, self.seconds, self.records, self.nbytes, failed=exc_type is not None)
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, self.observe) as timer:
+                result = func(*args, **kwargs)
+                if isinstance(result, Sized):
+                    timer.records = len(result)
+            return result
+        return wrapper
+
+
+# Default metrics port of each service mode, so that services running side by side on one host do not
+# race for a port. METRICS_PORT_<MODE> (e.g. METRICS_PORT_TRANSFORMER) overrides a mode's port; 0 disables it.
+METRICS_PORTS = {"ingestor": 8000, "transformer": 8001, "compactor": 8002, "replay": 8003}
+
+_server_port = None
+
+
+def metrics_port(mode: str) -> int:
+    """Returns the metrics port of a service mode (see METRICS_PORTS)."""
+    return int(os.getenv(f"METRICS_PORT_{mode.upper()}", str(METRICS_PORTS.get(mode, 8000))))
 
 
 def start_metrics_server(port: int = 8000):
     """
     Start an HTTP server that exposes Prometheus metrics on the given port.
+    Only the first call of a process starts a server; port 0 starts none.
     """
+    global _server_port
+    if not port or _server_port is not None:
+        return
     start_http_server(port)
+    _server_port = port
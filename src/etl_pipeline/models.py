@@ -1,22 +1,44 @@
 import hashlib
-from typing import Optional
+import json
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from pydantic import BaseModel
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, PrimaryKeyConstraint
+from sqlalchemy import Column, Index, PrimaryKeyConstraint
 from sqlalchemy.types import JSON
 
+@lru_cache(maxsize=65536)
+def company_id_for(name: str) -> int:
+    """
+    Generates a stable company_id from the first 8 hex digits of the MD5 hash of the company name.
+    Memoized, as the same few company names repeat across users and snapshots.
+    """
+    return int(hashlib.md5(name.encode()).hexdigest()[:8], 16)
+
+def record_hash(record: dict) -> str:
+    """SHA-256 of a raw API record's canonical JSON form (sorted keys), used to detect content changes."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def dimension_hash(row: dict, **parents) -> str:
+    """
+    Content hash keying a dimension row: record_hash of its column values, with the content hashes
+    of the rows it references (e.g. geo=<geo hash> for an address) in place of their ids.
+    """
+    return record_hash({**row, **parents})
+
 # ---------------------------
 # Ingestion Models
 # ---------------------------
 
+# Geo, Address and Company are dimensions keyed by content_hash (see dimension_hash): a row is written once
+# per distinct content, with INSERT ... ON CONFLICT DO NOTHING, and shared by every user and snapshot.
+
 class Geo(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: Optional[str] = Field(default=None, unique=True)
     lat: str
     lng: str
-    address_id: Optional[int] = Field(default=None, foreign_key="address.id")
-    # Reverse relationship (one-to-one) with Address.
-    address: Optional["Address"] = Relationship(back_populates="geo")
     
     class Config:
         extra = "allow"
@@ -24,15 +46,14 @@ class Geo(SQLModel, table=True):
 class Address(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Covers the geo's content too, so an address moving to other coordinates is a new row.
+    content_hash: Optional[str] = Field(default=None, unique=True)
     street: str
     suite: str
     city: str
     zipcode: str
-    # One-to-one relationship with Geo.
-    geo: Optional[Geo] = Relationship(
-        back_populates="address",
-        sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan", "single_parent": True}
-    )
+    geo_id: Optional[int] = Field(default=None, foreign_key="geo.id")
+    geo: Optional[Geo] = Relationship()
     
     class Config:
         extra = "allow"
@@ -40,6 +61,7 @@ class Address(SQLModel, table=True):
 class Company(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: Optional[str] = Field(default=None, unique=True)
     name: str
     catchPhrase: str
     bs: str
@@ -48,9 +70,13 @@ class Company(SQLModel, table=True):
         extra = "allow"
 
 class User(SQLModel, table=True):
+    # On PostgreSQL the table is range partitioned by extraction_ts (see etl_pipeline.partitions);
+    # other databases ignore the option and get a plain table. The primary key, led by user_id, serves
+    # "latest version of user X" lookups; the extraction_ts index serves "latest snapshot" ones.
     __table_args__ = (
         PrimaryKeyConstraint("user_id", "extraction_ts", name="user_pk"),
-        {"extend_existing": True},
+        Index("ix_user_extraction_ts", "extraction_ts"),
+        {"extend_existing": True, "postgresql_partition_by": "RANGE (extraction_ts)"},
     )
     # Original API id
     user_id: int = Field()
@@ -65,12 +91,9 @@ class User(SQLModel, table=True):
     company_id: Optional[int] = Field(default=None, foreign_key="company.id")
     raw: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     
-    address: Optional["Address"] = Relationship(
-        sa_relationship_kwargs={"cascade": "all, delete-orphan", "single_parent": True}
-    )
-    company: Optional["Company"] = Relationship(
-        sa_relationship_kwargs={"cascade": "all, delete-orphan", "single_parent": True}
-    )
+    # Many-to-one: dimension rows are shared, never owned (and deleted) by a user.
+    address: Optional["Address"] = Relationship()
+    company: Optional["Company"] = Relationship()
     
     class Config:
         extra = "allow"
@@ -105,9 +128,7 @@ class User(SQLModel, table=True):
         """
         result = {}
         if self.company:
-            # Generate a stable company_id using an MD5 hash of the company name.
-            h = hashlib.md5(self.company.name.encode()).hexdigest()[:8]
-            company_id = int(h, 16)
+            company_id = company_id_for(self.company.name)
             processed_company = ProcessedCompany.from_company(self.company, extraction_iso)
             result["processed_company"] = processed_company
             processed_user = ProcessedUser.from_user(self, extraction_iso, company_id)
@@ -117,35 +138,105 @@ class User(SQLModel, table=True):
             result["processed_user"] = processed_user
         return result
 
+class UserVersion(SQLModel, table=True):
+    """
+    SCD type 2 history written by the ingestor's CDC mode: one row per distinct version of a user's
+    raw record. The version's data is the user row with extraction_ts == valid_from; valid_to is the
+    extraction_ts of the snapshot that replaced (or dropped) it, and NULL for the current version.
+    """
+    __tablename__ = "user_version"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "valid_from", name="user_version_pk"),
+        {"extend_existing": True},
+    )
+    user_id: int = Field()
+    valid_from: int = Field()
+    valid_to: Optional[int] = Field(default=None, index=True)
+    content_hash: str
+
+class SnapshotHeartbeat(SQLModel, table=True):
+    """One cheap row per snapshot ingested in CDC mode, recording how many users changed."""
+    __tablename__ = "snapshot_heartbeat"
+    __table_args__ = {"extend_existing": True}
+    extraction_ts: int = Field(primary_key=True)
+    total: int
+    changed: int
+    unchanged: int
+    removed: int
+
+class DeadLetter(SQLModel, table=True):
+    """
+    A raw user record the ingestor could not insert (invalid, or rejected by the database), with the
+    error, kept for inspection and replay (see ingestor.replay_dead_letters).
+    """
+    __tablename__ = "dead_letter"
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    extraction_ts: int = Field(index=True)
+    user_id: Optional[int] = None
+    record: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    error: str
+    attempts: int = 1
+    created_at: float
+    # Set once a replay inserted the record.
+    replayed_at: Optional[float] = Field(default=None, index=True)
+
+# ---------------------------
+# Raw API resources extracted alongside users (validation only, see extractor.RESOURCES)
+# ---------------------------
+
+class Post(BaseModel):
+    userId: int
+    id: int
+    title: str
+    body: str
+
+class Comment(BaseModel):
+    postId: int
+    id: int
+    name: str
+    email: str
+    body: str
+
+class Album(BaseModel):
+    userId: int
+    id: int
+    title: str
+
+class Photo(BaseModel):
+    albumId: int
+    id: int
+    title: str
+    url: str
+    thumbnailUrl: str
+
+class Todo(BaseModel):
+    userId: int
+    id: int
+    title: str
+    completed: bool
+
 # ---------------------------
 # Processed Models (for Transformation)
 # ---------------------------
 
-class ProcessedCompany(BaseModel):
+# Processed rows are already validated (they come from the models above), so they are plain named
+# tuples: no per-instance dict or validation, the field order is fixed once per class (_fields) and
+# the output writers take instances as rows directly. The output folder name is the class attribute
+# path_name (see transform.OUTPUT_MODEL_MAPPING); it is not a column.
+
+class ProcessedCompany(NamedTuple):
     company_id: int
     name: str
     catchPhrase: str
     bs: str
     extraction_ts: str
-    # Used to determine the output folder name.
-    path_name: str = "processed_company"
 
     @classmethod
     def from_company(cls, company: Company, extraction_ts: str) -> "ProcessedCompany":
-        h = hashlib.md5(company.name.encode()).hexdigest()[:8]
-        company_id = int(h, 16)
-        return cls(
-            company_id=company_id,
-            name=company.name,
-            catchPhrase=company.catchPhrase,
-            bs=company.bs,
-            extraction_ts=extraction_ts
-        )
-
-    class Config:
-        orm_mode = True
+        return cls(company_id_for(company.name), company.name, company.catchPhrase, company.bs, extraction_ts)
 
-class ProcessedUser(BaseModel):
+class ProcessedUser(NamedTuple):
     user_id: int
     username: str
     phone: str
@@ -153,19 +244,7 @@ class ProcessedUser(BaseModel):
     website: str
     company_id: Optional[int]
     extraction_ts: str
-    path_name: str = "processed_user"
 
     @classmethod
     def from_user(cls, user: User, extraction_iso: str, company_id: Optional[int]) -> "ProcessedUser":
-        return cls(
-            user_id=user.user_id,
-            username=user.username,
-            phone=user.phone,
-            email=user.email,
-            website=user.website,
-            company_id=company_id,
-            extraction_ts=extraction_iso
-        )
-
-    class Config:
-        orm_mode = True
+        return cls(user.user_id, user.username, user.phone, user.email, user.website, company_id, extraction_iso)
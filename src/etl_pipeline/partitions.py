@@ -0,0 +1,151 @@
+"""
+Time partitioning of the user table on PostgreSQL.
+
+The user table is declared PARTITION BY RANGE (extraction_ts) (see models.User), with one partition
+per DB_PARTITION_DAYS days named user_pYYYYMMDD after its first day (UTC). maintain_partitions
+creates the partitions for the next DB_PARTITIONS_AHEAD days ahead of time, so inserts never wait
+on DDL, and, when DB_RETENTION_DAYS is set, drops the partitions whose whole range is older than
+the retention: a cheap metadata operation instead of row DELETEs and the vacuum they cause.
+
+Rows outside every dated partition (a dead letter replayed with the extraction_ts of a dropped
+partition, clock skew, a backfill) land in the DEFAULT partition, user_default, instead of failing.
+Before a dated partition is created, the default partition's rows in its range are moved into it
+(PostgreSQL refuses to create it otherwise), and the retention also purges old default rows.
+
+Other databases (SQLite) keep the plain table and maintain_partitions does nothing. A user table
+created on PostgreSQL before partitioning was introduced is left alone (with a warning).
+"""
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from etl_pipeline.logger import get_logger
+from etl_pipeline.models import User
+
+logger = get_logger(__name__)
+
+# Days covered by each partition.
+DB_PARTITION_DAYS = int(os.getenv("DB_PARTITION_DAYS", "1"))
+# Days ahead of now for which partitions are created.
+DB_PARTITIONS_AHEAD = int(os.getenv("DB_PARTITIONS_AHEAD", "7"))
+# Partitions whose range ended more than this many days ago are dropped (0 keeps everything).
+DB_RETENTION_DAYS = int(os.getenv("DB_RETENTION_DAYS", "0"))
+# Seconds between two maintain_partitions runs of the ingestor.
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600"))
+
+DAY = 86400
+PARTITIONED_TABLE = User.__tablename__
+
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+
+_PARTITION_NAME = re.compile(rf"^{PARTITIONED_TABLE}_p(\d{{8}})$")
+
+
+def partition_start(ts: int, days: int = DB_PARTITION_DAYS) -> int:
+    """Start (epoch seconds, UTC midnight) of the partition holding extraction_ts ts."""
+    span = days * DAY
+    return ts - ts % span
+
+
+def partition_name(start: int) -> str:
+    return f"{PARTITIONED_TABLE}_p{datetime.fromtimestamp(start, tz=timezone.utc):%Y%m%d}"
+
+
+def parse_partition_name(name: str):
+    """Returns the start of a partition named by partition_name, or None for any other table."""
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return int(datetime.strptime(match.group(1), "%Y%m%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+def plan_partitions(existing, now: float, ahead: int = DB_PARTITIONS_AHEAD, retention: int = DB_RETENTION_DAYS,
+                    days: int = DB_PARTITION_DAYS):
+    """
+    Given the names of the existing partitions, returns (create, drop): the (name, start, end) of the
+    partitions missing from now until ahead days later, and the names of the partitions that ended
+    more than retention days before now (none if retention is 0).
+    """
+    span = days * DAY
+    starts = {parse_partition_name(name): name for name in existing}
+    starts.pop(None, None)
+    create = []
+    start = partition_start(int(now), days)
+    while start <= now + ahead * DAY:
+        if start not in starts:
+            create.append((partition_name(start), start, start + span))
+        start += span
+    drop = []
+    if retention > 0:
+        drop = [name for start, name in sorted(starts.items()) if start + span <= now - retention * DAY]
+    return create, drop
+
+
+def _is_partitioned(connection) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": PARTITIONED_TABLE}).first() is not None
+
+
+def _existing_partitions(connection) -> list:
+    return list(connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+    ), {"table": PARTITIONED_TABLE}).scalars())
+
+
+def _create_partition(connection, name: str, start: int, end: int):
+    """Creates a dated partition, moving the rows of its range out of the default partition first."""
+    bounds = {"start": start, "end": end}
+    in_range = "extraction_ts >= :start AND extraction_ts < :end"
+    moved = connection.execute(text(f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE {in_range} LIMIT 1'), bounds).first()
+    if moved:
+        connection.execute(text(f'CREATE TEMPORARY TABLE "{name}_moved" (LIKE "{DEFAULT_PARTITION}") ON COMMIT DROP'))
+        connection.execute(text(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE {in_range} RETURNING *) '
+            f'INSERT INTO "{name}_moved" SELECT * FROM moved'
+        ), bounds)
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{PARTITIONED_TABLE}" FOR VALUES FROM ({start}) TO ({end})'
+    ))
+    if moved:
+        connection.execute(text(f'INSERT INTO "{PARTITIONED_TABLE}" SELECT * FROM "{name}_moved"'))
+        logger.info("Moved the %s rows of %s out of %s.", PARTITIONED_TABLE, name, DEFAULT_PARTITION)
+
+
+def maintain_partitions(engine, now: float = None, ahead: int = DB_PARTITIONS_AHEAD,
+                        retention: int = DB_RETENTION_DAYS):
+    """
+    Creates the upcoming partitions of the user table and drops the expired ones (see plan_partitions).
+    Returns (names created, names dropped); does nothing outside PostgreSQL.
+    """
+    if engine.dialect.name != "postgresql":
+        return [], []
+    now = time.time() if now is None else now
+    with engine.begin() as connection:
+        if not _is_partitioned(connection):
+            logger.warning("Table %s is not partitioned (created before partitioning?); skipping partition "
+                           "maintenance.", PARTITIONED_TABLE)
+            return [], []
+        existing = _existing_partitions(connection)
+        if DEFAULT_PARTITION not in existing:
+            connection.execute(text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{PARTITIONED_TABLE}" DEFAULT'))
+        create, drop = plan_partitions(existing, now, ahead, retention)
+        for name, start, end in create:
+            _create_partition(connection, name, start, end)
+        for name in drop:
+            connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+        if retention > 0:
+            # Default rows whose partition would have been dropped.
+            cutoff = partition_start(int(now - retention * DAY))
+            connection.execute(text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE extraction_ts < :cutoff'), {"cutoff": cutoff})
+    if create:
+        logger.info("Created %d %s partition(s): %s", len(create), PARTITIONED_TABLE, ", ".join(name for name, _, _ in create))
+    if drop:
+        logger.info("Dropped %d %s partition(s) past the %d day retention: %s", len(drop), PARTITIONED_TABLE,
+                    retention, ", ".join(drop))
+    return [name for name, _, _ in create], drop
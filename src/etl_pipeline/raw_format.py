@@ -0,0 +1,100 @@
+import gzip
+import io
+import json
+import os
+
+from etl_pipeline.jsonstream import iter_json_array
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+RAW_FILE_PREFIX = "raw_data_"
+
+# Raw encodings selectable with RAW_FORMAT, mapped to (file extension, json.dump kwargs).
+#   json-pretty  indented JSON array (the original datalake format)
+#   json         compact JSON array
+#   json.gz      gzip-compressed compact JSON array
+#   json.zst     zstd-compressed compact JSON array (requires the optional zstandard package)
+#   ndjson       one compact JSON record per line
+#   ndjson.gz    gzip-compressed ndjson
+RAW_FORMATS = {
+    "json-pretty": (".json", {"indent": 2}),
+    "json": (".json", {"separators": (",", ":")}),
+    "json.gz": (".json.gz", {"separators": (",", ":")}),
+    "json.zst": (".json.zst", {"separators": (",", ":")}),
+    "ndjson": (".ndjson", {"separators": (",", ":")}),
+    "ndjson.gz": (".ndjson.gz", {"separators": (",", ":")}),
+}
+
+# Every extension a raw file can have, longest first so ".json.gz" wins over ".json".
+RAW_EXTENSIONS = sorted({ext for ext, _ in RAW_FORMATS.values()}, key=len, reverse=True)
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def raw_file_name(extraction_ts: int, fmt: str, prefix: str = RAW_FILE_PREFIX) -> str:
+    """Returns the raw file name for a snapshot, e.g. raw_data_1234567890.json.gz."""
+    if fmt not in RAW_FORMATS:
+        raise ValueError(f"Unknown raw format {fmt!r}; expected one of {sorted(RAW_FORMATS)}")
+    return f"{prefix}{extraction_ts}{RAW_FORMATS[fmt][0]}"
+
+
+def split_raw_file_name(path: str, prefix: str = RAW_FILE_PREFIX):
+    """Returns (ts, extension) for a raw file name of the form {prefix}{ts}{extension} (raw_data_ by default), or None."""
+    base = os.path.basename(path)
+    if not base.startswith(prefix):
+        return None
+    for ext in RAW_EXTENSIONS:
+        if base.endswith(ext):
+            ts_str = base[len(prefix):-len(ext)]
+            if ts_str.isdigit():
+                return int(ts_str), ext
+            return None
+    return None
+
+
+def _open_binary(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL) if "w" in mode else gzip.open(path, mode)
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading or writing .zst raw files requires the 'zstandard' package")
+        raw = open(path, mode)
+        if "w" in mode:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode)
+
+
+def open_raw(path: str):
+    """Opens a raw file of any supported encoding for reading as UTF-8 text."""
+    return io.TextIOWrapper(_open_binary(path, "rb"), encoding="utf-8")
+
+
+def write_raw(data, path: str, fmt: str):
+    """Writes the list of records data to path in the given raw format."""
+    _, dump_kwargs = RAW_FORMATS[fmt]
+    with io.TextIOWrapper(_open_binary(path, "wb"), encoding="utf-8") as f:
+        if fmt.startswith("ndjson"):
+            for record in data:
+                f.write(json.dumps(record, **dump_kwargs))
+                f.write("\n")
+        else:
+            # json.dumps uses the C encoder; json.dump would encode chunk by chunk in pure Python.
+            f.write(json.dumps(data, **dump_kwargs))
+
+
+def iter_raw_records(f, path: str, streaming: bool = False):
+    """
+    Iterates the records of an opened raw file (see open_raw).
+    ndjson files are always read line by line; JSON arrays are parsed incrementally when
+    streaming is set and loaded whole otherwise.
+    """
+    if ".ndjson" in os.path.basename(path):
+        return (json.loads(line) for line in f if line.strip())
+    if streaming:
+        return iter_json_array(f)
+    return json.load(f)
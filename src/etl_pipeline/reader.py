@@ -0,0 +1,211 @@
+"""
+Partition-pruned reads of the processed datalake.
+
+    from etl_pipeline.reader import read_records, read_batches
+
+    for user in read_records("processed_user", start="2024-05-01T10:00", end="2024-05-01T12:00", columns=["user_id", "email"]):
+        ...
+    for batch in read_batches("processed_company", as_of=time.time()):  # {column: [values]}
+        ...
+
+Only the YYYY-MM-DD/HH partitions overlapping [start, end) are listed, and only the files whose
+processed_<name>_<ts> timestamp falls in it (and whose snapshot has a commit marker) are opened;
+compacted partitions are read through their _compacted.json index (see etl_pipeline.compactor),
+keeping just the rows of the wanted snapshots.
+Records are streamed file by file, typed according to the model (CSV values included), so memory use
+is bounded by one file (or one batch) whatever the range.
+
+Times are epoch seconds, datetimes or ISO strings; naive ones are taken as UTC, like the partitions.
+With as_of=T only the latest snapshot extracted at or before T (and not before start) is read.
+"""
+import os
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from etl_pipeline import transform
+from etl_pipeline.compactor import committed_timestamps, iter_partitions, merge_sorted, partition_end, read_index, split_processed_file_name
+from etl_pipeline.writers import coerce_value, model_schema, writer_for_path
+
+# Rows per batch yielded by read_batches.
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", "10000"))
+
+# One snapshot (the output of one raw file) stored in the processed datalake.
+# path is the loose processed file, or the partition's compacted file when compacted is True.
+Snapshot = namedtuple("Snapshot", ["ts", "path", "compacted"])
+
+
+def _model(model):
+    """Resolves an OUTPUT_MODEL_MAPPING key, a model path_name or a model class to the model class."""
+    if isinstance(model, type):
+        return model
+    for key, model_cls in transform.OUTPUT_MODEL_MAPPING.items():
+        if model in (key, model_cls.path_name):
+            return model_cls
+    raise ValueError(f"Unknown processed model {model!r}; expected one of {sorted(transform.OUTPUT_MODEL_MAPPING)}")
+
+
+def to_epoch(value):
+    """Converts epoch seconds, a datetime or an ISO 8601 string (naive means UTC) to epoch seconds."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _iso(ts: int) -> str:
+    """extraction_ts column value of the snapshot with timestamp ts (see transform._transform_file)."""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _in_range(ts, start, end) -> bool:
+    return (start is None or ts >= start) and (end is None or ts < end)
+
+
+def _partitions(root: str, start, end):
+    """Yields the partition directories under root whose hour overlaps [start, end), oldest first."""
+    for directory, date, hour in iter_partitions(root):
+        hour_end = partition_end(date, hour, utc=True)
+        if (start is None or hour_end > start) and (end is None or hour_end - 3600 < end):
+            yield directory
+
+
+def _partition_snapshots(directory: str, path_name: str, start, end) -> list:
+    """Returns the snapshots of one partition in [start, end), in timestamp order, following its compaction index."""
+    index = read_index(directory)
+    compacted = set(index["timestamps"]) if index else set()
+    snapshots = [
+        Snapshot(ts, os.path.join(directory, index["file"]), True)
+        for ts in compacted if _in_range(ts, start, end)
+    ]
+    committed = committed_timestamps(directory)
+    for name in os.listdir(directory):
+        parsed = split_processed_file_name(name)
+        # Loose files whose timestamp is in the index are leftovers of an interrupted compaction; those
+        # without a commit marker belong to a snapshot whose outputs are not all in place yet.
+        if (parsed is not None and parsed[0] == path_name and parsed[1] not in compacted and parsed[1] in committed
+                and _in_range(parsed[1], start, end)):
+            snapshots.append(Snapshot(parsed[1], os.path.join(directory, name), False))
+    return sorted(snapshots)
+
+
+def list_snapshots(model, start=None, end=None, processed_dir: str = None) -> list:
+    """Returns the snapshots of a processed model extracted in [start, end), oldest first."""
+    model_cls = _model(model)
+    start, end = to_epoch(start), to_epoch(end)
+    root = os.path.join(processed_dir or transform.PROCESSED_DIR, model_cls.path_name)
+    snapshots = []
+    for directory in _partitions(root, start, end):
+        snapshots.extend(_partition_snapshots(directory, model_cls.path_name, start, end))
+    return snapshots
+
+
+def latest_snapshot(model, as_of, start=None, processed_dir: str = None):
+    """Returns the timestamp of the latest snapshot extracted at or before as_of (and not before start), or None."""
+    model_cls = _model(model)
+    # Snapshot timestamps are whole seconds: [start, end) with end = as_of + 1 includes as_of itself.
+    end, start = int(to_epoch(as_of)) + 1, to_epoch(start)
+    root = os.path.join(processed_dir or transform.PROCESSED_DIR, model_cls.path_name)
+    # Walk the partitions backwards from as_of: the first one holding an earlier snapshot has the latest.
+    for directory in reversed(list(_partitions(root, start, end))):
+        snapshots = _partition_snapshots(directory, model_cls.path_name, start, end)
+        if snapshots:
+            return snapshots[-1].ts
+    return None
+
+
+def _holds_any(wanted: list):
+    """Returns a row group filter (see OutputWriter.iter_rows) accepting the groups whose extraction_ts range holds a wanted value."""
+    def keep(stats):
+        column = stats.get("extraction_ts")
+        if column is None or column["min"] is None or column["max"] is None:
+            return True
+        i = bisect_left(wanted, column["min"])
+        return i < len(wanted) and wanted[i] <= column["max"]
+    return keep
+
+
+def _read_partition(directory: str, model_cls, start, end, columns):
+    """
+    Yields the typed records of one partition's snapshots in [start, end), in timestamp order.
+    If the compactor swaps the partition while it is being read (a file disappears before it is
+    opened), the partition is listed again and only the snapshots not read yet are read.
+    """
+    schema = {name: type_name for name, type_name, _ in model_schema(model_cls)}
+    names = columns or list(schema)
+    done = set()
+    for attempt in (1, 2):
+        snapshots = [snapshot for snapshot in _partition_snapshots(directory, model_cls.path_name, start, end)
+                     if snapshot.ts not in done]
+        compacted = {_iso(snapshot.ts): snapshot.ts for snapshot in snapshots if snapshot.compacted}
+
+        def typed(row):
+            return {name: coerce_value(row[name], schema[name]) for name in names}
+
+        def existing():
+            if not compacted:
+                return
+            path = next(snapshot.path for snapshot in snapshots if snapshot.compacted)
+            # The compacted file is sorted by extraction_ts: row groups whose extraction_ts range holds
+            # none of the wanted snapshots are skipped from their statistics, without being read, and
+            # only the rows of the wanted snapshots are kept from the others.
+            read_columns = names if "extraction_ts" in names else names + ["extraction_ts"]
+            keep = _holds_any(sorted(compacted))
+            for row in writer_for_path(path).iter_rows(path, read_columns, keep):
+                if row["extraction_ts"] in compacted:
+                    yield row["extraction_ts"], (compacted[row["extraction_ts"]], row)
+
+        def loader(snapshot):
+            return lambda: ((snapshot.ts, row) for row in writer_for_path(snapshot.path).iter_rows(snapshot.path, names))
+
+        loose = [(_iso(snapshot.ts), loader(snapshot)) for snapshot in snapshots if not snapshot.compacted]
+        try:
+            for ts, row in merge_sorted(existing(), loose):
+                # Rows of one snapshot are all yielded before the next one starts.
+                done.add(ts)
+                yield typed(row)
+            return
+        except FileNotFoundError:
+            # Files are only removed after the index swap and each one is opened before any of its
+            # rows is read, so the snapshot whose file vanished has not been started: read it again
+            # from the new index.
+            if attempt == 2:
+                raise
+
+
+def read_records(model, start=None, end=None, columns=None, as_of=None, processed_dir: str = None):
+    """
+    Lazily yields the records (dicts restricted to columns, when given) of a processed model
+    extracted in [start, end), oldest snapshot first. With as_of, only the records of the latest
+    snapshot extracted at or before as_of are yielded.
+    """
+    model_cls = _model(model)
+    start, end = to_epoch(start), to_epoch(end)
+    if as_of is not None:
+        ts = latest_snapshot(model_cls, as_of, start, processed_dir)
+        if ts is None:
+            return
+        start, end = ts, ts + 1
+    root = os.path.join(processed_dir or transform.PROCESSED_DIR, model_cls.path_name)
+    for directory in _partitions(root, start, end):
+        yield from _read_partition(directory, model_cls, start, end, columns)
+
+
+def read_batches(model, start=None, end=None, columns=None, as_of=None, batch_size: int = READ_BATCH_SIZE,
+                 processed_dir: str = None):
+    """Same as read_records, but yields {column: [values]} batches of up to batch_size records."""
+    batch = []
+    for record in read_records(model, start, end, columns, as_of, processed_dir):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield _columns(batch)
+            batch = []
+    if batch:
+        yield _columns(batch)
+
+
+def _columns(records: list) -> dict:
+    return {name: [record[name] for record in records] for name in records[0]}
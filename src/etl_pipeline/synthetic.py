@@ -0,0 +1,53 @@
+import random
+
+_FIRST_NAMES = ["Leanne", "Ervin", "Clementine", "Patricia", "Chelsey", "Dennis", "Kurtis", "Nicholas", "Glenna", "Clementina"]
+_LAST_NAMES = ["Graham", "Howell", "Bauch", "Lebsack", "Dietrich", "Schulist", "Weissnat", "Runolfsdottir", "Reichert", "DuBuque"]
+_STREETS = ["Kulas Light", "Victor Plains", "Douglas Extension", "Hoeger Mall", "Skiles Walks", "Norberto Crossing"]
+_CITIES = ["Gwenborough", "Wisokyburgh", "McKenziehaven", "South Elvis", "Roscoeview", "South Christy"]
+_DOMAINS = ["april.biz", "melissa.tv", "yesenia.net", "kory.org", "annie.ca", "jasper.info"]
+_COMPANY_WORDS = ["Romaguera", "Crona", "Deckow", "Keebler", "Robel", "Corkery", "Considine", "Hoeger", "Yost", "Abernathy"]
+_CATCH_PHRASES = ["Multi-layered client-server neural-net", "Proactive didactic contingency", "Face to face bifurcated interface"]
+_BS = ["harness real-time e-markets", "synergize scalable supply-chains", "e-enable strategic applications"]
+
+
+def generate_user(rng: random.Random, user_id: int, companies: int = 1000) -> dict:
+    """Returns one JSONPlaceholder-shaped user record with values drawn from rng."""
+    first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+    username = f"{first}{user_id}"
+    company = rng.randrange(companies)
+    return {
+        "id": user_id,
+        "name": f"{first} {last}",
+        "username": username,
+        "email": f"{username}@{rng.choice(_DOMAINS)}",
+        "address": {
+            "street": rng.choice(_STREETS),
+            "suite": f"Apt. {rng.randrange(1000)}",
+            "city": rng.choice(_CITIES),
+            "zipcode": f"{rng.randrange(100000):05d}-{rng.randrange(10000):04d}",
+            "geo": {
+                "lat": f"{rng.uniform(-90, 90):.4f}",
+                "lng": f"{rng.uniform(-180, 180):.4f}",
+            },
+        },
+        "phone": f"1-{rng.randrange(1000):03d}-{rng.randrange(1000):03d}-{rng.randrange(10000):04d}",
+        "website": f"{last.lower()}{user_id}.org",
+        "company": {
+            # Company attributes depend only on the company number, so employees share a company.
+            "name": f"{_COMPANY_WORDS[company % 10]}-{_COMPANY_WORDS[company // 10 % 10]} {company}",
+            "catchPhrase": _CATCH_PHRASES[company % len(_CATCH_PHRASES)],
+            "bs": _BS[company % len(_BS)],
+        },
+    }
+
+
+def iter_users(n: int, seed: int = 0, companies: int = 1000):
+    """Yields n users with ids 1..n; the same (n, seed, companies) always yields the same records."""
+    rng = random.Random(seed)
+    for user_id in range(1, n + 1):
+        yield generate_user(rng, user_id, companies)
+
+
+def generate_users(n: int, seed: int = 0, companies: int = 1000) -> list:
+    """List version of iter_users."""
+    return list(iter_users(n, seed, companies))
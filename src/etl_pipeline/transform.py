@@ -1,20 +1,37 @@
 import os
 import glob
-import json
-import csv
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
 
+from etl_pipeline.compactor import backfill_commit_markers, commit_marker_path, is_committed
 from etl_pipeline.logger import get_logger
-from etl_pipeline.metrics import TRANSFORM_SUCCESS, TRANSFORM_FAILURE
-from etl_pipeline.models import User, ProcessedCompany, ProcessedUser
+from etl_pipeline.manifest import Manifest, DONE, FAILED
+from etl_pipeline.metrics import TRANSFORM_SUCCESS, TRANSFORM_FAILURE, TRANSFORMATION_ERRORS
+from etl_pipeline.metrics import TRANSFORM_BACKLOG_FILES, TRANSFORM_BACKLOG_AGE, observe_stage, timed
+from etl_pipeline.metrics import metrics_port, start_metrics_server
+from etl_pipeline.models import User, ProcessedCompany, ProcessedUser, company_id_for
+from etl_pipeline.watcher import create_watcher
+from etl_pipeline.raw_format import RAW_FILE_PREFIX, split_raw_file_name, open_raw, iter_raw_records
+from etl_pipeline.writers import get_writer
 
 logger = get_logger(__name__)
 
 # Base directories and polling interval.
 RAW_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
+MANIFEST_PATH = "data/manifest.db"
+# Raw files may use any encoding of raw_format.RAW_FORMATS; extract_timestamp filters the matches.
+RAW_FILE_PATTERN = f"{RAW_FILE_PREFIX}*"
 POLL_INTERVAL = 30  # seconds
+# How new raw files are noticed: "inotify", "poll" (every POLL_INTERVAL) or "auto" (inotify when available).
+# With inotify, POLL_INTERVAL only bounds the time between safety rescans.
+TRANSFORM_WATCH = os.getenv("TRANSFORM_WATCH", "auto")
+# Raw files at least this large are streamed record by record instead of loaded with json.load.
+STREAMING_THRESHOLD_BYTES = int(os.getenv("TRANSFORM_STREAMING_THRESHOLD_BYTES", str(64 * 1024 * 1024)))
+# In streaming mode, processed instances are flushed to the output files every this many records per model.
+STREAMING_BATCH_SIZE = int(os.getenv("TRANSFORM_STREAMING_BATCH_SIZE", "5000"))
 
 # Define a mapping from keys (returned by User.transform()) to output model classes.
 # Also, each processed model has an attribute "path_name" which we use for output folder.
@@ -27,93 +44,267 @@ for key, model_cls in OUTPUT_MODEL_MAPPING.items():
     if not hasattr(model_cls, "path_name"):
         setattr(model_cls, "path_name", model_cls.__name__.lower())
 
-def extract_timestamp(file_path):
-    """Extracts the epoch timestamp from a raw file name of the form 'raw_data_{ts}.json'."""
-    base = os.path.basename(file_path)
+# Output format ("csv", "colz" or "parquet", see writers.WRITERS) for each key of OUTPUT_MODEL_MAPPING.
+# OUTPUT_FORMAT sets the default and OUTPUT_FORMAT_<KEY> (e.g. OUTPUT_FORMAT_PROCESSED_USER) overrides one model.
+OUTPUT_FORMATS = {
+    key: os.getenv(f"OUTPUT_FORMAT_{key.upper()}", os.getenv("OUTPUT_FORMAT", "csv"))
+    for key in OUTPUT_MODEL_MAPPING
+}
+
+# Deduplication of the company dimension (see CompanyDimension):
+#   "off"        one processed_company row per user, as produced by the transformation
+#   "extraction" each distinct company once per raw file
+#   "changes"    a company only when its attributes differ from the last version written
+COMPANY_DEDUP = os.getenv("COMPANY_DEDUP", "extraction")
+COMPANY_CACHE_SIZE = int(os.getenv("COMPANY_CACHE_SIZE", "100000"))
+COMPANY_KEY = "processed_company"
+
+class CompanyDimension:
+    """
+    Filters the processed_company instances of each raw file according to COMPANY_DEDUP.
+    Keeps a per-file seen-set of company ids and, in "changes" mode, an LRU of
+    company_id -> attributes last written. The LRU is only updated once a file has been
+    written successfully (commit_file), so a failed file never hides a version from a retry.
+    State is per process: "changes" mode requires files to be processed in order by one process.
+    """
+
+    def __init__(self, mode=COMPANY_DEDUP, cache_size=COMPANY_CACHE_SIZE):
+        self.mode = mode
+        self.cache_size = cache_size
+        self.written = OrderedDict()
+        self.file_seen = {}
+
+    def start_file(self):
+        self.file_seen = {}
+
+    def admit(self, company) -> bool:
+        """Returns whether the processed company should be written for the current file."""
+        return self.admit_values(company.company_id, (company.name, company.catchPhrase, company.bs))
+
+    def admit_values(self, company_id, attributes) -> bool:
+        """Same as admit, for a company given as its id and (name, catchPhrase, bs) tuple."""
+        if self.mode == "off":
+            return True
+        if company_id in self.file_seen:
+            return False
+        self.file_seen[company_id] = attributes
+        return self.mode != "changes" or self.written.get(company_id) != attributes
+
+    def filter_columns(self, columns):
+        """Returns the processed_company columns restricted to the rows admit_values accepts."""
+        keep = [
+            i for i, company_id in enumerate(columns["company_id"])
+            if self.admit_values(company_id, (columns["name"][i], columns["catchPhrase"][i], columns["bs"][i]))
+        ]
+        if len(keep) == len(columns["company_id"]):
+            return columns
+        return {name: [values[i] for i in keep] for name, values in columns.items()}
+
+    def commit_file(self):
+        if self.mode != "changes":
+            return
+        for company_id, attributes in self.file_seen.items():
+            self.written[company_id] = attributes
+            self.written.move_to_end(company_id)
+        while len(self.written) > self.cache_size:
+            self.written.popitem(last=False)
+
+_company_dimension = None
+
+def company_dimension() -> CompanyDimension:
+    """Returns this process's CompanyDimension, created on first use with the current COMPANY_DEDUP."""
+    global _company_dimension
+    if _company_dimension is None or _company_dimension.mode != COMPANY_DEDUP:
+        _company_dimension = CompanyDimension(COMPANY_DEDUP)
+    return _company_dimension
+
+def set_output_format(fmt, keys=None):
+    """Selects the output format for the given OUTPUT_MODEL_MAPPING keys (all of them by default)."""
+    get_writer(fmt)  # validate the name
+    for key in keys or OUTPUT_MODEL_MAPPING:
+        OUTPUT_FORMATS[key] = fmt
+
+def output_file_path(key, ts, processed_dir=PROCESSED_DIR):
+    """
+    Returns the output file of OUTPUT_MODEL_MAPPING[key] for the raw file with timestamp ts:
+        processed_dir / <model.path_name> / <partition>/processed_<model.path_name>_<ts><ext>
+    where partition is YYYY-MM-DD/HH in UTC and ext comes from the key's output format.
+    """
+    model_cls = OUTPUT_MODEL_MAPPING[key]
+    writer = get_writer(OUTPUT_FORMATS[key])
+    # Partition based on UTC: YYYY-MM-DD/HH
+    partition = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
+    return os.path.join(
+        processed_dir,
+        model_cls.path_name,
+        partition,
+        f"processed_{model_cls.path_name}_{ts}{writer.extension}"
+    )
+
+def temp_output_path(file_path):
+    """
+    Temporary name an output file is written under before being renamed into place: the same name,
+    dot-prefixed, in the same directory (so the rename is atomic and keeps the extension).
+    """
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}")
+
+def _remove_temp(tmp_path):
     try:
-        ts_str = base[len("raw_data_"):-len(".json")]
-        return int(ts_str)
-    except Exception as e:
-        logger.error("Failed to extract timestamp from %s: %s", file_path, e)
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def extract_timestamp(file_path):
+    """
+    Extracts the epoch timestamp from a raw file name of the form 'raw_data_{ts}{ext}',
+    where ext is any raw format extension ('.json', '.json.gz', '.ndjson', ...).
+    """
+    parsed = split_raw_file_name(file_path)
+    if parsed is None:
+        logger.error("Failed to extract timestamp from %s: not a raw data file name", file_path)
         return None
+    return parsed[0]
 
-def get_unprocessed_raw_files(raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR):
+def expected_output_files(ts, processed_dir=PROCESSED_DIR):
     """
-    Scans raw_dir recursively for raw_data_*.json files.
-    For each file, it checks that for every output model in OUTPUT_MODEL_MAPPING,
-    a corresponding CSV file exists in:
-        processed_dir / <model.path_name> / <partition>/processed_<model.path_name>_<ts>.csv
-    Returns a list of (file_path, ts) for files that are not yet fully processed.
+    Returns the output file paths (see output_file_path) that fully processing the raw file
+    with timestamp ts produces, one for every output model in OUTPUT_MODEL_MAPPING.
     """
-    pattern = os.path.join(raw_dir, "**", "raw_data_*.json")
+    return [output_file_path(key, ts, processed_dir) for key in OUTPUT_MODEL_MAPPING]
+
+def get_unprocessed_raw_files(raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR, manifest=None):
+    """
+    Returns a list of (file_path, ts) for raw files that are not yet fully processed, oldest first.
+
+    Without a manifest, scans raw_dir recursively for raw_data_* files and checks that
+    their outputs were committed (see compactor.is_committed).
+
+    With a Manifest, only newly landed raw files are listed and the status comes from the manifest.
+    Pending files whose outputs were committed just before a crash are recorded as done
+    instead of being transformed again; on its first call a freshly created manifest is rebuilt
+    from disk that way.
+    """
+    if manifest is not None:
+        rebuilding = manifest.is_new
+        manifest.discover(raw_dir, RAW_FILE_PATTERN, extract_timestamp)
+        pending = manifest.pending()
+        if not rebuilding:
+            return _skip_committed(manifest, pending, processed_dir)
+        unprocessed = _skip_committed(manifest, pending, processed_dir)
+        manifest.is_new = False
+        logger.info("Rebuilt manifest from disk: %d raw file(s) still unprocessed.", len(unprocessed))
+        return unprocessed
+
+    pattern = os.path.join(raw_dir, "**", RAW_FILE_PATTERN)
     files = glob.glob(pattern, recursive=True)
     unprocessed = []
     for file in files:
         ts = extract_timestamp(file)
         if ts is None:
             continue
-        # Partition based on UTC: YYYY-MM-DD/HH
-        partition = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
-        all_exist = True
-        for model_cls in OUTPUT_MODEL_MAPPING.values():
-            output_file = os.path.join(
-                processed_dir,
-                model_cls.path_name,
-                partition,
-                f"processed_{model_cls.path_name}_{ts}.csv"
-            )
-            if not os.path.exists(output_file):
-                all_exist = False
-                break
-        if not all_exist:
+        if not is_committed(processed_dir, ts):
+            unprocessed.append((file, ts))
+    return sorted(unprocessed, key=lambda item: item[1])
+
+def _skip_committed(manifest, pending, processed_dir):
+    """
+    Marks done the pending raw files whose outputs were committed: the transformer stopped after
+    committing them but before recording it in the manifest. Costs one stat per pending file only.
+    """
+    unprocessed = []
+    for file, ts in pending:
+        outputs = expected_output_files(ts, processed_dir)
+        if is_committed(processed_dir, ts):
+            logger.debug("Outputs of %s were already committed; marking it done.", file)
+            manifest.mark(file, ts, DONE, outputs)
+        else:
             unprocessed.append((file, ts))
     return unprocessed
 
-def generic_write_csv(model_cls, instances, extraction_ts, processed_dir=PROCESSED_DIR):
+def generic_write(model_cls, instances, extraction_ts, processed_dir=PROCESSED_DIR, fmt="csv"):
     """
-    Writes a list of model instances (processed) to a CSV file.
+    Writes a list of model instances (processed) with the output writer for fmt.
     The output folder is determined by:
       processed_dir / model_cls.path_name / <partition>
     where partition is derived from extraction_ts (formatted as YYYY-MM-DD/HH in UTC).
     The file is named:
-      processed_<model_cls.path_name>_<extraction_ts>.csv
-    The CSV headers are determined from the model's __fields__.
+      processed_<model_cls.path_name>_<extraction_ts><ext>
+    The columns are the model's _fields. The file is written under a temporary name (see
+    temp_output_path) and published with _commit_sinks, which renames it into place and creates
+    the snapshot's commit marker; once that exists, readers and the compactor see every output of
+    the snapshot, so write the other models of a snapshot before this one.
+    Returns the file path, or None if the write failed.
     """
+    writer = get_writer(fmt)
     partition = datetime.fromtimestamp(extraction_ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
     folder = os.path.join(processed_dir, model_cls.path_name, partition)
     os.makedirs(folder, exist_ok=True)
-    file_path = os.path.join(folder, f"processed_{model_cls.path_name}_{extraction_ts}.csv")
-    fieldnames = list(model_cls.__fields__.keys())
-    file_exists = os.path.exists(file_path)
+    file_path = os.path.join(folder, f"processed_{model_cls.path_name}_{extraction_ts}{writer.extension}")
+    tmp_path = temp_output_path(file_path)
     try:
-        with open(file_path, "a", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            for instance in instances:
-                writer.writerow(instance.dict())
+        with timed("output_write") as timer:
+            sink = writer.open(tmp_path, model_cls)
+            sink.write_rows(instances)
+            sink.close()
+            if _commit_sinks({model_cls.path_name: sink}, extraction_ts, processed_dir) is None:
+                _remove_temp(tmp_path)
+                return None
+            timer.records = len(instances)
         logger.info("Wrote %d records to %s", len(instances), file_path)
+        return file_path
     except Exception as e:
-        logger.error("Error writing CSV for %s: %s", model_cls.__name__, e)
-        TRANSFORM_FAILURE.inc()
+        logger.error("Error writing %s for %s: %s", writer.name, model_cls.__name__, e)
+        _remove_temp(tmp_path)
+        return None
 
-def generic_transform(raw_file, extraction_ts, transformation_fn):
+def generic_write_csv(model_cls, instances, extraction_ts, processed_dir=PROCESSED_DIR):
+    """Writes a list of processed instances to CSV (see generic_write)."""
+    return generic_write(model_cls, instances, extraction_ts, processed_dir, fmt="csv")
+
+def transform_file(raw_file, extraction_ts, transformation_fn, streaming=None, batch_fn=None):
     """
     Generic transformation process:
-      - Reads a raw JSON file.
+      - Reads a raw file in any raw_format encoding (JSON array, ndjson, gzip/zstd compressed).
       - For each record, applies transformation_fn(record, extraction_iso)
         to obtain a dict mapping output keys (e.g. "processed_company", "processed_user")
         to processed model instances.
-      - Aggregates processed instances by key.
-      - For each key in the aggregated dict, writes the output to CSV using generic_write_csv.
+      - Aggregates processed instances by key, dropping repeated companies (see CompanyDimension).
+      - For each key of OUTPUT_MODEL_MAPPING, writes the output (possibly with no rows) with the
+        writer selected in OUTPUT_FORMATS (see output_file_path for the file layout).
+    When a batch_fn is given, records are instead transformed a batch at a time with
+    batch_fn(records, extraction_ts) -> (outputs, errors), where outputs maps each output key
+    to column-oriented data ({column: [values]}) and errors counts the records it skipped.
+    A batch for which batch_fn raises falls back to transformation_fn record by record.
+    In streaming mode the records are parsed incrementally (iter_json_array) and each key is
+    flushed every STREAMING_BATCH_SIZE instances, so memory stays flat regardless of file size.
+    When streaming is None, it is enabled for files of at least STREAMING_THRESHOLD_BYTES on disk.
+    The outputs are written under temporary names and only renamed into place once every one of
+    them is complete (see _commit_sinks); on failure they are removed, so a raw file's outputs are
+    either all there or (after a crash mid-commit) redone as a whole, never partially written.
+
+    Does not touch the metrics, so it can run in a worker process; see generic_transform.
+    Returns a dict with:
+      - "outputs": list of written output files, or None if the file could not be transformed
+      - "records": number of records read
+      - "record_errors": number of records that could not be transformed
+      - "seconds": time spent on the file
+      - "bytes": size of the raw file on disk (None if unknown)
     """
+    with timed("transform_file", observe=False) as timer:
+        result = _transform_file(raw_file, extraction_ts, transformation_fn, streaming, batch_fn)
+    result["seconds"] = timer.seconds
+    return result
+
+def _transform_file(raw_file, extraction_ts, transformation_fn, streaming, batch_fn):
+    """Body of transform_file, without the timing."""
     try:
-        with open(raw_file, "r") as f:
-            data = json.load(f)
-    except Exception as e:
-        logger.error("Error reading raw file %s: %s", raw_file, e)
-        TRANSFORM_FAILURE.inc()
-        return
+        raw_bytes = os.path.getsize(raw_file)
+    except OSError:
+        # Let the open() below report the error.
+        raw_bytes = None
+    if streaming is None:
+        streaming = raw_bytes is not None and raw_bytes >= STREAMING_THRESHOLD_BYTES
 
     # Create a consistent extraction timestamp string in ISO 8601 UTC.
     extraction_iso = datetime.fromtimestamp(extraction_ts, tz=timezone.utc).isoformat()
@@ -121,47 +312,292 @@ def generic_transform(raw_file, extraction_ts, transformation_fn):
     # key -> list of processed model instances.
     # "processed_company" -> ProcessedCompany instance
     aggregated = {}
-    for record in data:
+    # Raw records waiting for batch_fn.
+    batch = []
+    # key -> writers.OutputSink, opened on the key's first write.
+    sinks = {}
+    result = {"outputs": None, "records": 0, "record_errors": 0, "bytes": raw_bytes}
+    companies = company_dimension()
+    companies.start_file()
+    ok = True
+
+    def transform_record(record):
         try:
-            result = transformation_fn(record, extraction_iso)
+            processed = transformation_fn(record, extraction_iso)
             # transformation_fn returns a dict mapping keys to processed instances.
-            for key, instance in result.items():
+            for key, instance in processed.items():
+                if key == COMPANY_KEY and not companies.admit(instance):
+                    continue
                 aggregated.setdefault(key, []).append(instance)
         except Exception as e:
             logger.error("Error transforming record %s: %s", record.get("id"), e)
-            TRANSFORM_FAILURE.inc()
-            continue
+            result["record_errors"] += 1
+
+    def transform_batch():
+        try:
+            outputs, errors = batch_fn(batch, extraction_ts)
+        except Exception as e:
+            logger.warning("Batch transformation failed (%s); falling back to per-record transformation.", e)
+            for record in batch:
+                transform_record(record)
+            return True
+        result["record_errors"] += errors
+        if COMPANY_KEY in outputs:
+            outputs[COMPANY_KEY] = companies.filter_columns(outputs[COMPANY_KEY])
+        return _write_columns(outputs, extraction_ts, sinks)
 
+    try:
+        with open_raw(raw_file) as f:
+            records = iter_raw_records(f, raw_file, streaming)
+            for record in records:
+                result["records"] += 1
+                if batch_fn is not None:
+                    batch.append(record)
+                    if streaming and len(batch) >= STREAMING_BATCH_SIZE:
+                        ok = transform_batch() and ok
+                        batch = []
+                    continue
+                transform_record(record)
+                if streaming:
+                    for key, instances in aggregated.items():
+                        if len(instances) >= STREAMING_BATCH_SIZE:
+                            ok = _write_outputs({key: instances}, extraction_ts, sinks) and ok
+                            aggregated[key] = []
+        if batch:
+            ok = transform_batch() and ok
+        # Every output model gets a file, even without rows, so the raw file counts as processed.
+        remaining = {key: [] for key in OUTPUT_MODEL_MAPPING}
+        remaining.update(aggregated)
+        ok = _write_outputs(remaining, extraction_ts, sinks) and ok
+    except Exception as e:
+        logger.error("Error reading raw file %s: %s", raw_file, e)
+        _close_sinks(sinks)
+        _discard_sinks(sinks)
+        return result
+
+    ok = _close_sinks(sinks) and ok
+    outputs = _commit_sinks(sinks, extraction_ts) if ok else None
+    if outputs is None:
+        _discard_sinks(sinks)
+        return result
+    companies.commit_file()
+    logger.info("Transformed raw file %s with timestamp %d%s", raw_file, extraction_ts, " (streaming)" if streaming else "")
+    result["outputs"] = outputs
+    return result
+
+def _record_result(result):
+    """Updates the metrics for one transformed raw file: it counts exactly once as a success or a failure."""
+    TRANSFORMATION_ERRORS.inc(result["record_errors"])
+    failed = result["outputs"] is None
+    if failed:
+        TRANSFORM_FAILURE.inc()
+    else:
+        TRANSFORM_SUCCESS.inc()
+    if "seconds" in result:
+        observe_stage("transform_file", result["seconds"], result["records"], result.get("bytes"), failed)
+
+def generic_transform(raw_file, extraction_ts, transformation_fn, streaming=None, batch_fn=None):
+    """
+    Transforms one raw file (see transform_file) and records its metrics.
+    Returns the list of written output files, or None if the file could not be transformed.
+    """
+    result = transform_file(raw_file, extraction_ts, transformation_fn, streaming, batch_fn)
+    _record_result(result)
+    return result["outputs"]
+
+def process_files(unprocessed, transformation_fn, manifest=None, executor=None, batch_fn=None):
+    """
+    Transforms a batch of (raw_file, ts) pairs, either in this process or fanned out over a
+    ProcessPoolExecutor. Each raw file produces its own output files, so workers never write the
+    same file. Metrics and the manifest are only updated here, in the parent process.
+    Returns a dict with the "files", "records" and "seconds" of the batch.
+    """
+    records = 0
+
+    def finish(raw_file, ts, result):
+        _record_result(result)
+        if manifest is not None:
+            outputs = result["outputs"]
+            manifest.mark(raw_file, ts, FAILED if outputs is None else DONE, outputs or ())
+        return result["records"]
+
+    with timed("transform_batch") as timer:
+        if executor is None:
+            for raw_file, ts in unprocessed:
+                logger.info("Processing raw file: %s", raw_file)
+                records += finish(raw_file, ts, transform_file(raw_file, ts, transformation_fn, batch_fn=batch_fn))
+        else:
+            futures = {
+                executor.submit(transform_file, raw_file, ts, transformation_fn, None, batch_fn): (raw_file, ts)
+                for raw_file, ts in unprocessed
+            }
+            for future in as_completed(futures):
+                raw_file, ts = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error("Worker failed on raw file %s: %s", raw_file, e)
+                    result = {"outputs": None, "records": 0, "record_errors": 0}
+                records += finish(raw_file, ts, result)
+        timer.records = records
+
+    elapsed = timer.seconds
+    if elapsed > 0:
+        logger.info(
+            "Processed %d file(s), %d record(s) in %.2fs (%.2f files/s, %.0f records/s)",
+            len(unprocessed), records, elapsed, len(unprocessed) / elapsed, records / elapsed
+        )
+    return {"files": len(unprocessed), "records": records, "seconds": elapsed}
+
+def worker_pool(workers, mp_context=None) -> ProcessPoolExecutor:
+    """
+    Returns a process pool for process_files whose workers start with this process's output
+    formats, COMPANY_DEDUP and PROCESSED_DIR (see _init_worker), whatever the start method: a
+    spawned or forkserver worker would otherwise re-read them from the environment.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+        initargs=(dict(OUTPUT_FORMATS), COMPANY_DEDUP, PROCESSED_DIR),
+    )
+
+def _init_worker(output_formats, company_dedup, processed_dir):
+    global COMPANY_DEDUP, PROCESSED_DIR
+    OUTPUT_FORMATS.update(output_formats)
+    COMPANY_DEDUP = company_dedup
+    PROCESSED_DIR = processed_dir
+
+def update_backlog(unprocessed, now=None):
+    """Sets the transformer backlog gauges from a list of (raw_file, ts): file count and age of the oldest file."""
+    now = time.time() if now is None else now
+    TRANSFORM_BACKLOG_FILES.set(len(unprocessed))
+    TRANSFORM_BACKLOG_AGE.set(max(0.0, now - min(ts for _, ts in unprocessed)) if unprocessed else 0.0)
+
+def _write_outputs(aggregated, extraction_ts, sinks):
+    """
+    Writes each key's processed instances to its output sink, opening the sink (in the key's
+    OUTPUT_FORMATS format) on first use, even for an empty list. Returns False if any write failed.
+    """
+    ok = True
     for key, instances in aggregated.items():
         if key not in OUTPUT_MODEL_MAPPING:
             logger.error("No output mapping for key: %s", key)
             continue
         model_cls = OUTPUT_MODEL_MAPPING[key]
-        generic_write_csv(model_cls, instances, extraction_ts, processed_dir=PROCESSED_DIR)
+        try:
+            sink = _sink_for(key, extraction_ts, sinks)
+            if instances:
+                sink.write_rows(instances)
+        except Exception as e:
+            logger.error("Error writing output for %s: %s", model_cls.__name__, e)
+            ok = False
+    return ok
 
-    logger.info("Transformed raw file %s with timestamp %d", raw_file, extraction_ts)
-    TRANSFORM_SUCCESS.inc()
+def _write_columns(outputs, extraction_ts, sinks):
+    """Column-oriented counterpart of _write_outputs for batch_fn results ({key: {column: [values]}})."""
+    ok = True
+    for key, columns in outputs.items():
+        if key not in OUTPUT_MODEL_MAPPING:
+            logger.error("No output mapping for key: %s", key)
+            continue
+        try:
+            _sink_for(key, extraction_ts, sinks).write_columns(columns)
+        except Exception as e:
+            logger.error("Error writing output for %s: %s", OUTPUT_MODEL_MAPPING[key].__name__, e)
+            ok = False
+    return ok
+
+def _sink_for(key, extraction_ts, sinks):
+    """
+    Returns the open output sink of a key, opening it in the key's OUTPUT_FORMATS format on first use.
+    The sink writes to the temporary name of the output file (see temp_output_path).
+    """
+    sink = sinks.get(key)
+    if sink is None:
+        file_path = output_file_path(key, extraction_ts, PROCESSED_DIR)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        sink = sinks[key] = get_writer(OUTPUT_FORMATS[key]).open(temp_output_path(file_path), OUTPUT_MODEL_MAPPING[key])
+    return sink
+
+def _final_path(sink):
+    directory, name = os.path.split(sink.file_path)
+    return os.path.join(directory, name[1:])
 
-def run_transformer(transformation_fn, raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR, poll_interval=POLL_INTERVAL):
+def _commit_sinks(sinks, extraction_ts, processed_dir=None):
     """
-    Continuous polling: every poll_interval seconds, it scans raw_dir for new raw files
-    that have not been processed (based on the output files for all output models),
-    and applies generic_transform to each.
+    Renames the closed output files of one raw file into place, then creates the snapshot's commit
+    marker in processed_dir (PROCESSED_DIR by default, see compactor.commit_marker_path): readers, the compactor and get_unprocessed_raw_files
+    only see the outputs once it exists, so a crash between two renames leaves nothing half visible
+    and the raw file is transformed again, overwriting the outputs already renamed. If a rename or
+    the marker fails, the outputs already renamed are removed. Returns the output paths, or None.
+    """
+    outputs = []
+    try:
+        for sink in sinks.values():
+            os.replace(sink.file_path, _final_path(sink))
+            outputs.append(_final_path(sink))
+        marker = commit_marker_path(processed_dir or PROCESSED_DIR, extraction_ts)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, "w").close()
+    except OSError as e:
+        logger.error("Error committing the outputs of snapshot %d: %s", extraction_ts, e)
+        for output in outputs:
+            _remove_temp(output)
+        return None
+    return outputs
+
+def _discard_sinks(sinks):
+    """Removes the temporary files of sinks that were not committed."""
+    for sink in sinks.values():
+        _remove_temp(sink.file_path)
+
+def _close_sinks(sinks):
+    """Finalizes every open output file. Returns False if any of them failed."""
+    ok = True
+    for sink in sinks.values():
+        try:
+            sink.close()
+            logger.info("Wrote %d records to %s", sink.rows, _final_path(sink))
+        except Exception as e:
+            logger.error("Error closing output file %s: %s", sink.file_path, e)
+            ok = False
+    return ok
+
+def run_transformer(transformation_fn, raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR, poll_interval=POLL_INTERVAL,
+                    manifest_path=MANIFEST_PATH, workers=1, batch_fn=None, watch=TRANSFORM_WATCH):
+    """
+    Continuous processing: it looks for new raw files in raw_dir that have not been processed and
+    applies generic_transform to each, then waits for the next raw file to land (see watcher;
+    watch is "inotify", "poll" or "auto") or for poll_interval seconds, whichever comes first.
+    Processing status is tracked in the manifest at manifest_path (rebuilt from disk if missing);
+    with manifest_path=None it falls back to scanning for the output files of all output models.
     The transformation_fn is a function with signature:
          f(record: dict, extraction_iso: str) -> dict
-    which returns a mapping from output keys to processed model instances.
+    which returns a mapping from output keys to processed model instances; with workers > 1
+    it must be picklable (a module-level function) as files are transformed in a process pool.
+    An optional batch_fn (see transform_file) is preferred over transformation_fn when given.
     """
-    logger.info("Starting continuous transformer process.")
+    global COMPANY_DEDUP
+    logger.info("Starting continuous transformer process with %d worker(s).", workers)
+    if workers > 1 and COMPANY_DEDUP == "changes":
+        # Workers see disjoint subsets of files out of order, so per-process change tracking could skip a version.
+        logger.warning("COMPANY_DEDUP=changes requires a single worker; using 'extraction' instead.")
+        COMPANY_DEDUP = "extraction"
+    backfill_commit_markers(processed_dir, OUTPUT_MODEL_MAPPING.values())
+    manifest = Manifest(manifest_path) if manifest_path else None
+    executor = worker_pool(workers) if workers > 1 else None
+    watcher = create_watcher(raw_dir, RAW_FILE_PATTERN, watch)
+    logger.info("Watching %s for new raw files with %s.", raw_dir, type(watcher).__name__)
     while True:
-        unprocessed = get_unprocessed_raw_files(raw_dir, processed_dir)
+        unprocessed = get_unprocessed_raw_files(raw_dir, processed_dir, manifest)
+        update_backlog(unprocessed)
         if unprocessed:
             logger.info("Found %d unprocessed raw file(s).", len(unprocessed))
-            for raw_file, ts in unprocessed:
-                logger.info("Processing raw file: %s", raw_file)
-                generic_transform(raw_file, ts, transformation_fn)
+            process_files(unprocessed, transformation_fn, manifest, executor, batch_fn)
         else:
             logger.info("No new raw files to process.")
-        time.sleep(poll_interval)
+        landed = watcher.wait(poll_interval)
+        if landed:
+            logger.info("%d raw file(s) landed.", len(landed))
 
 def default_transformation_fn(record, extraction_iso):
     """
@@ -174,5 +610,47 @@ def default_transformation_fn(record, extraction_iso):
     user_obj = User.from_api(record, ts)
     return user_obj.transform(extraction_iso)
 
+def default_batch_transformation_fn(records, extraction_ts):
+    """
+    Batch counterpart of default_transformation_fn: maps raw user records straight to the
+    processed_user and processed_company columns, without building any per-record object
+    and formatting the extraction timestamp once per batch.
+    Returns (outputs, errors) where outputs maps each OUTPUT_MODEL_MAPPING key to {column: [values]}
+    in the model's field order, and errors counts the records that could not be transformed.
+    """
+    extraction_iso = datetime.fromtimestamp(extraction_ts, tz=timezone.utc).isoformat()
+    users = {name: [] for name in ProcessedUser._fields}
+    companies = {name: [] for name in ProcessedCompany._fields}
+    errors = 0
+    for record in records:
+        try:
+            # Read every value before appending any, so a bad record leaves no partial row behind.
+            company = record.get("company")
+            company_id = company_id_for(company["name"]) if company else None
+            user_id, username, phone = int(record["id"]), record["username"], record["phone"]
+            email, website = record["email"], record["website"]
+            if company:
+                name, catch_phrase, bs = company["name"], company["catchPhrase"], company["bs"]
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.error("Error transforming record %s: %s", record.get("id") if isinstance(record, dict) else None, e)
+            errors += 1
+            continue
+        users["user_id"].append(user_id)
+        users["username"].append(username)
+        users["phone"].append(phone)
+        users["email"].append(email)
+        users["website"].append(website)
+        users["company_id"].append(company_id)
+        users["extraction_ts"].append(extraction_iso)
+        if company:
+            companies["company_id"].append(company_id)
+            companies["name"].append(name)
+            companies["catchPhrase"].append(catch_phrase)
+            companies["bs"].append(bs)
+            companies["extraction_ts"].append(extraction_iso)
+
+    return {"processed_user": users, "processed_company": companies}, errors
+
 if __name__ == "__main__":
-    run_transformer(default_transformation_fn)
+    start_metrics_server(metrics_port("transformer"))
+    run_transformer(default_transformation_fn, batch_fn=default_batch_transformation_fn)
@@ -0,0 +1,175 @@
+"""
+New raw file notification for the transformer.
+
+InotifyWatcher wakes up as soon as a raw file is complete under the raw directory (Linux inotify,
+through ctypes, with watches added recursively as partition directories appear); PollingWatcher
+simply sleeps. Both expose wait(timeout) -> [paths], so the transformer loop is the same either way:
+wait, then rescan. Only complete files are reported: the extractor writes raw files under a
+dot-prefixed temporary name and renames them into place (IN_MOVED_TO), so events on dot-prefixed
+names are ignored and each raw file wakes the transformer once; files written in place by other
+producers are reported once closed (IN_CLOSE_WRITE).
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from fnmatch import fnmatch
+
+from etl_pipeline.logger import get_logger
+
+logger = get_logger(__name__)
+
+# inotify(7) constants.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    """Returns libc with the inotify functions, or None when they are not available (non-Linux)."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class PollingWatcher:
+    """Fallback watcher: wait() sleeps for the timeout and reports nothing, so the caller rescans every timeout."""
+
+    def __init__(self, root: str, pattern: str = "*"):
+        self.root = root
+        self.pattern = pattern
+
+    def wait(self, timeout: float) -> list:
+        time.sleep(timeout)
+        return []
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Watches root and every directory below it for complete files whose name matches pattern.
+    wait(timeout) blocks until at least one such file lands (or timeout seconds pass) and returns
+    their paths. Raises OSError if inotify is not available.
+    """
+
+    def __init__(self, root: str, pattern: str = "*"):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.root = root
+        self.pattern = pattern
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # watch descriptor -> directory
+        self.watches = {}
+        os.makedirs(root, exist_ok=True)
+        self._watch_tree(root)
+
+    def _add_watch(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # The directory may already be gone again; anything else (e.g. ENOSPC, out of watches) is worth knowing.
+            if error != errno.ENOENT:
+                logger.warning("Could not watch %s: %s", directory, os.strerror(error))
+            return False
+        self.watches[wd] = directory
+        return True
+
+    def _watch_tree(self, directory: str) -> list:
+        """
+        Watches directory and its subdirectories. Returns the matching files already in them, which
+        may have landed before the watch was in place.
+        """
+        found = []
+        if not self._add_watch(directory):
+            return found
+        for dirpath, dirnames, filenames in os.walk(directory):
+            for name in dirnames:
+                self._add_watch(os.path.join(dirpath, name))
+            found.extend(os.path.join(dirpath, name) for name in filenames if fnmatch(name, self.pattern))
+        return found
+
+    def wait(self, timeout: float) -> list:
+        # Events that report nothing (temporary files, files still being written) do not end the wait.
+        deadline = time.monotonic() + timeout
+        paths = []
+        while not paths:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                break
+            while True:
+                try:
+                    buffer = os.read(self.fd, _READ_SIZE)
+                except BlockingIOError:
+                    break
+                paths.extend(self._parse(buffer))
+        return paths
+
+    def _parse(self, buffer: bytes) -> list:
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; the caller's rescan after wait() returns still finds the files.
+                logger.warning("inotify event queue overflowed under %s", self.root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or name.startswith("."):
+                # Dot-prefixed names are temporary files, renamed into place once complete.
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.extend(self._watch_tree(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and fnmatch(name, self.pattern):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(root: str, pattern: str = "*", mode: str = "auto"):
+    """
+    Returns a watcher for root: mode "inotify" requires inotify, "poll" always polls and
+    "auto" uses inotify when the platform has it and falls back to polling otherwise.
+    """
+    if mode == "poll":
+        return PollingWatcher(root, pattern)
+    try:
+        return InotifyWatcher(root, pattern)
+    except OSError as e:
+        if mode == "inotify":
+            raise
+        logger.warning("inotify unavailable (%s); falling back to polling %s", e, root)
+        return PollingWatcher(root, pattern)
@@ -0,0 +1,352 @@
+import csv
+import json
+import os
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import get_args, get_type_hints
+
+from etl_pipeline.logger import get_logger
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+    pq = None
+
+logger = get_logger(__name__)
+
+# Python types of processed model fields -> type names stored in columnar files.
+_TYPE_NAMES = {int: "int", float: "float", bool: "bool", str: "str"}
+
+
+@lru_cache(maxsize=None)
+def model_schema(model_cls):
+    """
+    Returns [(field name, type name, nullable)] for a processed model (a NamedTuple, see
+    etl_pipeline.models), in output column order. Computed once per model class.
+    """
+    hints = get_type_hints(model_cls)
+    schema = []
+    for name in model_cls._fields:
+        field_type = hints[name]
+        args = get_args(field_type)
+        nullable = type(None) in args
+        if nullable:
+            field_type = next(arg for arg in args if arg is not type(None))
+        schema.append((name, _TYPE_NAMES.get(field_type, "str"), nullable))
+    return schema
+
+
+def coerce_value(value, type_name: str):
+    """Restores the type of a value read back from CSV (where everything is a string and None is "")."""
+    if not isinstance(value, str) or type_name == "str":
+        return value
+    if value == "":
+        return None
+    if type_name == "int":
+        return int(value)
+    if type_name == "float":
+        return float(value)
+    if type_name == "bool":
+        return value == "True"
+    return value
+
+
+def _column_stats(values):
+    present = [value for value in values if value is not None]
+    return {
+        "min": min(present) if present else None,
+        "max": max(present) if present else None,
+        "nulls": len(values) - len(present),
+    }
+
+
+def _merge_stats(total, stats):
+    if total is None:
+        return dict(stats)
+    for key, pick in (("min", min), ("max", max)):
+        if stats[key] is not None:
+            total[key] = stats[key] if total[key] is None else pick(total[key], stats[key])
+    total["nulls"] += stats["nulls"]
+    return total
+
+
+class OutputSink(ABC):
+    """
+    An output file being written for one processed model. Batches can be written as rows
+    (tuples in schema order) or columns (dict of field name -> list); close() finalizes the file.
+    Sinks implement write_columns; write_rows transposes the rows into columns unless a
+    row-oriented sink overrides it.
+    """
+
+    def __init__(self, file_path, schema):
+        self.file_path = file_path
+        self.schema = schema
+        self.fieldnames = [name for name, _, _ in schema]
+        self.rows = 0
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if rows:
+            self.write_columns({name: list(values) for name, values in zip(self.fieldnames, zip(*rows))})
+
+    @abstractmethod
+    def write_columns(self, columns):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class OutputWriter(ABC):
+    """Base class of the output formats: opens sinks and reads the files back."""
+
+    name = ""
+    extension = ""
+
+    @abstractmethod
+    def open(self, file_path, model_cls) -> OutputSink:
+        ...
+
+    def read_stats(self, file_path):
+        """Returns {column: {"min", "max", "nulls"}} for the file, or None if the format keeps no statistics."""
+        return None
+
+    @abstractmethod
+    def iter_rows(self, file_path, columns=None, keep=None):
+        """
+        Yields the file's records as dicts, restricted to columns when given. In formats keeping
+        per-row-group statistics, keep(stats) is called with each row group's {column: {"min", "max",
+        "nulls"}} and the row groups it rejects are skipped without being read.
+        """
+
+
+class _CsvSink(OutputSink):
+    def __init__(self, file_path, schema):
+        super().__init__(file_path, schema)
+        self.file = open(file_path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.fieldnames)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+
+    def write_columns(self, columns):
+        self.write_rows(zip(*(columns[name] for name in self.fieldnames)))
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter(OutputWriter):
+    """Row-oriented CSV with a header line (the original processed format)."""
+
+    name = "csv"
+    extension = ".csv"
+
+    def open(self, file_path, model_cls):
+        return _CsvSink(file_path, model_schema(model_cls))
+
+    def iter_rows(self, file_path, columns=None, keep=None):
+        # No statistics: keep is ignored and every row is read.
+        with open(file_path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield {name: row[name] for name in columns} if columns else row
+
+
+# Colz layout:
+#   MAGIC | column chunks ... | footer JSON | footer length (8 bytes, little endian) | MAGIC
+# Every write() appends one row group with one zlib-compressed JSON chunk per column. The footer holds
+# the schema, the offset/length and min/max/null-count of every chunk, and file-level statistics, so
+# readers can skip whole files from the footer alone and decompress only the columns they need.
+COLZ_MAGIC = b"COLZ1"
+COLZ_LEVEL = 6
+
+
+class _ColzSink(OutputSink):
+    def __init__(self, file_path, schema):
+        super().__init__(file_path, schema)
+        self.file = open(file_path, "wb")
+        self.file.write(COLZ_MAGIC)
+        self.row_groups = []
+        self.stats = {name: None for name in self.fieldnames}
+
+    def write_columns(self, columns):
+        n = len(columns[self.fieldnames[0]]) if self.fieldnames else 0
+        if not n:
+            return
+        group = {"rows": n, "columns": {}}
+        for name in self.fieldnames:
+            values = list(columns[name])
+            chunk = zlib.compress(json.dumps(values, separators=(",", ":")).encode(), COLZ_LEVEL)
+            stats = _column_stats(values)
+            group["columns"][name] = {"offset": self.file.tell(), "length": len(chunk), **stats}
+            self.file.write(chunk)
+            self.stats[name] = _merge_stats(self.stats[name], stats)
+        self.row_groups.append(group)
+        self.rows += n
+
+    def close(self):
+        footer = json.dumps({
+            "version": 1,
+            "schema": [{"name": name, "type": type_name, "nullable": nullable} for name, type_name, nullable in self.schema],
+            "rows": self.rows,
+            "stats": {name: stats or {"min": None, "max": None, "nulls": 0} for name, stats in self.stats.items()},
+            "row_groups": self.row_groups,
+        }).encode()
+        self.file.write(footer)
+        self.file.write(struct.pack("<Q", len(footer)))
+        self.file.write(COLZ_MAGIC)
+        self.file.close()
+
+
+class ColzWriter(OutputWriter):
+    """Typed, compressed, column-chunked binary format with per-file and per-chunk min/max statistics."""
+
+    name = "colz"
+    extension = ".colz"
+
+    def open(self, file_path, model_cls):
+        return _ColzSink(file_path, model_schema(model_cls))
+
+    @staticmethod
+    def read_footer(file_path):
+        with open(file_path, "rb") as f:
+            f.seek(-(8 + len(COLZ_MAGIC)), os.SEEK_END)
+            (length,) = struct.unpack("<Q", f.read(8))
+            if f.read(len(COLZ_MAGIC)) != COLZ_MAGIC:
+                raise ValueError(f"{file_path} is not a colz file")
+            f.seek(-(8 + len(COLZ_MAGIC) + length), os.SEEK_END)
+            return json.loads(f.read(length))
+
+    def read_stats(self, file_path):
+        return self.read_footer(file_path)["stats"]
+
+    def iter_column_batches(self, file_path, columns=None, keep=None):
+        """
+        Yields one {column: values} dict per row group, decompressing only the requested columns
+        of the row groups keep(stats) accepts (see OutputWriter.iter_rows), all of them by default.
+        """
+        footer = self.read_footer(file_path)
+        names = columns or [field["name"] for field in footer["schema"]]
+        with open(file_path, "rb") as f:
+            for group in footer["row_groups"]:
+                if keep is not None and not keep(group["columns"]):
+                    continue
+                batch = {}
+                for name in names:
+                    chunk = group["columns"][name]
+                    f.seek(chunk["offset"])
+                    batch[name] = json.loads(zlib.decompress(f.read(chunk["length"])))
+                yield batch
+
+    def iter_rows(self, file_path, columns=None, keep=None):
+        for batch in self.iter_column_batches(file_path, columns, keep):
+            names = list(batch)
+            for values in zip(*batch.values()):
+                yield dict(zip(names, values))
+
+
+_ARROW_TYPES = {}
+if pyarrow is not None:
+    _ARROW_TYPES = {"int": pyarrow.int64(), "float": pyarrow.float64(), "bool": pyarrow.bool_(), "str": pyarrow.string()}
+
+
+class _ParquetSink(OutputSink):
+    def __init__(self, file_path, schema):
+        super().__init__(file_path, schema)
+        self.arrow_schema = pyarrow.schema(
+            [pyarrow.field(name, _ARROW_TYPES[type_name], nullable) for name, type_name, nullable in schema]
+        )
+        self.writer = pq.ParquetWriter(file_path, self.arrow_schema, compression="zstd")
+
+    def write_columns(self, columns):
+        table = pyarrow.Table.from_pydict({name: list(columns[name]) for name in self.fieldnames}, schema=self.arrow_schema)
+        if table.num_rows:
+            self.writer.write_table(table)
+            self.rows += table.num_rows
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetWriter(OutputWriter):
+    """Parquet via pyarrow (optional dependency); one row group per written batch."""
+
+    name = "parquet"
+    extension = ".parquet"
+
+    def open(self, file_path, model_cls):
+        return _ParquetSink(file_path, model_schema(model_cls))
+
+    @staticmethod
+    def _row_group_stats(metadata, i):
+        """Returns {column: {"min", "max", "nulls"}} of row group i (min and max are None when unknown)."""
+        group = metadata.row_group(i)
+        stats = {}
+        for j in range(group.num_columns):
+            column = group.column(j)
+            chunk_stats = column.statistics
+            if chunk_stats is None or not chunk_stats.has_min_max:
+                stats[column.path_in_schema] = {"min": None, "max": None, "nulls": chunk_stats.null_count if chunk_stats else 0}
+            else:
+                stats[column.path_in_schema] = {"min": chunk_stats.min, "max": chunk_stats.max, "nulls": chunk_stats.null_count}
+        return stats
+
+    def read_stats(self, file_path):
+        metadata = pq.ParquetFile(file_path).metadata
+        stats = {}
+        for i in range(metadata.num_row_groups):
+            for name, chunk in self._row_group_stats(metadata, i).items():
+                stats[name] = _merge_stats(stats.get(name), chunk)
+        return stats
+
+    def iter_column_batches(self, file_path, columns=None, keep=None):
+        parquet_file = pq.ParquetFile(file_path)
+        row_groups = None
+        if keep is not None:
+            metadata = parquet_file.metadata
+            row_groups = [i for i in range(metadata.num_row_groups) if keep(self._row_group_stats(metadata, i))]
+            if not row_groups:
+                return
+        for batch in parquet_file.iter_batches(columns=columns, row_groups=row_groups):
+            yield batch.to_pydict()
+
+    def iter_rows(self, file_path, columns=None, keep=None):
+        for batch in self.iter_column_batches(file_path, columns, keep):
+            names = list(batch)
+            for values in zip(*batch.values()):
+                yield dict(zip(names, values))
+
+
+WRITERS = {writer.name: writer for writer in (CsvWriter(), ColzWriter(), ParquetWriter())}
+_warned_parquet_fallback = []
+
+
+def get_writer(name: str) -> OutputWriter:
+    """
+    Returns the output writer for a format name ("csv", "colz" or "parquet").
+    "parquet" falls back to "colz" when pyarrow is not installed.
+    """
+    if name == "parquet" and pq is None:
+        if not _warned_parquet_fallback:
+            logger.warning("pyarrow is not installed; writing colz instead of parquet")
+            _warned_parquet_fallback.append(True)
+        name = "colz"
+    if name not in WRITERS:
+        raise ValueError(f"Unknown output format {name!r}; expected one of {sorted(WRITERS)}")
+    return WRITERS[name]
+
+
+def writer_for_path(file_path: str) -> OutputWriter:
+    """Returns the writer whose extension matches file_path."""
+    for writer in WRITERS.values():
+        if file_path.endswith(writer.extension):
+            return writer
+    raise ValueError(f"No output writer for {file_path}")
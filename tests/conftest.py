@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# The logger opens LOG_FILE (logs/etl.log by default) when etl_pipeline is first imported; keep the
+# test runs' logs out of the working tree.
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="etl-tests-"), "etl.log"))
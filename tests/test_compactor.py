@@ -0,0 +1,85 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from etl_pipeline import compactor, extractor, transform
+from etl_pipeline.synthetic import generate_users
+from etl_pipeline.writers import ColzWriter
+
+# Three snapshots within the same hour (2021-01-01 00:xx UTC).
+TIMESTAMPS = (1609459200, 1609459260, 1609459320)
+
+@pytest.fixture
+def datalake(tmp_path, monkeypatch):
+    raw_dir, processed_dir, resources_dir = tmp_path / "raw", tmp_path / "processed", tmp_path / "resources"
+    monkeypatch.setattr(transform, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform, "PROCESSED_DIR", str(processed_dir))
+    monkeypatch.setattr(transform, "OUTPUT_FORMATS", {key: "csv" for key in transform.OUTPUT_MODEL_MAPPING})
+    return str(raw_dir), str(processed_dir), str(resources_dir)
+
+def land_and_transform(raw_dir, processed_dir, timestamps):
+    for ts in timestamps:
+        # Reverse the user order so the compacted output has something to sort.
+        extractor.save_raw_data(list(reversed(generate_users(5, seed=ts))), ts, raw_dir)
+    unprocessed = transform.get_unprocessed_raw_files(raw_dir, processed_dir)
+    transform.process_files(unprocessed, transform.default_transformation_fn)
+
+def compact(datalake):
+    raw_dir, processed_dir, resources_dir = datalake
+    return compactor.run_compaction(raw_dir, processed_dir, resources_dir, now=time.time() + 3600, grace=0)
+
+def test_compaction_merges_closed_partitions(datalake):
+    raw_dir, processed_dir, _ = datalake
+    land_and_transform(raw_dir, processed_dir, TIMESTAMPS)
+    assert compact(datalake) == {"raw": 3, "processed": 6}
+
+    partition = os.path.join(processed_dir, "processeduser", "2021-01-01", "00")
+    index = compactor.read_index(partition)
+    assert index["timestamps"] == list(TIMESTAMPS) and index["rows"] == 15
+    assert sorted(os.listdir(partition)) == [compactor.INDEX_FILE, index["file"]]
+    rows = list(ColzWriter().iter_rows(os.path.join(partition, index["file"]), ["user_id", "extraction_ts"]))
+    assert rows == sorted(rows, key=lambda row: (row["extraction_ts"], row["user_id"]))
+    assert isinstance(rows[0]["user_id"], int), "CSV values should be restored to their model types."
+
+    # Nothing is left to transform, although the per-snapshot outputs and raw files are gone.
+    assert transform.get_unprocessed_raw_files(raw_dir, processed_dir) == []
+    raw_partition = os.path.dirname(extractor.save_raw_data([], TIMESTAMPS[0], raw_dir))
+    os.remove(os.path.join(raw_partition, f"raw_data_{TIMESTAMPS[0]}.json"))
+    raw_index = compactor.read_index(raw_partition)
+    snapshots = list(compactor.iter_compacted_raw(os.path.join(raw_partition, raw_index["file"])))
+    assert [ts for ts, _ in snapshots] == list(TIMESTAMPS)
+    assert len(snapshots[0][1]) == 5
+
+def test_late_files_are_merged_into_the_next_generation(datalake):
+    raw_dir, processed_dir, _ = datalake
+    land_and_transform(raw_dir, processed_dir, TIMESTAMPS[1:])
+    compact(datalake)
+    partition = os.path.join(processed_dir, "processeduser", "2021-01-01", "00")
+    first = compactor.read_index(partition)
+
+    land_and_transform(raw_dir, processed_dir, TIMESTAMPS[:1])
+    assert compact(datalake) == {"raw": 1, "processed": 2}
+    second = compactor.read_index(partition)
+    assert second["generation"] == first["generation"] + 1
+    assert second["timestamps"] == list(TIMESTAMPS) and second["rows"] == 15
+    assert sorted(os.listdir(partition)) == [compactor.INDEX_FILE, second["file"]]
+    rows = list(ColzWriter().iter_rows(os.path.join(partition, second["file"]), ["extraction_ts"]))
+    assert rows == sorted(rows, key=lambda row: row["extraction_ts"])
+
+def test_untransformed_raw_partitions_are_not_compacted(datalake):
+    raw_dir, processed_dir, _ = datalake
+    file_path = extractor.save_raw_data(generate_users(5), TIMESTAMPS[0], raw_dir)
+    assert compact(datalake) == {"raw": 0, "processed": 0}
+    assert os.path.exists(file_path)
+    assert transform.get_unprocessed_raw_files(raw_dir, processed_dir) == [(file_path, TIMESTAMPS[0])]
+
+def test_commit_markers_are_backfilled_for_older_datalakes(datalake):
+    raw_dir, processed_dir, _ = datalake
+    land_and_transform(raw_dir, processed_dir, TIMESTAMPS)
+    # A datalake written before commit markers: snapshots with an output for every model count as committed.
+    shutil.rmtree(os.path.join(processed_dir, compactor.COMMITS_DIR))
+    os.remove(os.path.join(processed_dir, "processeduser", "2021-01-01", "00", f"processed_processeduser_{TIMESTAMPS[2]}.csv"))
+    assert compact(datalake) == {"raw": 0, "processed": 4}
+    assert [compactor.is_committed(processed_dir, ts) for ts in TIMESTAMPS] == [True, True, False]
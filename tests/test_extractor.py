@@ -1,4 +1,16 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from prometheus_client import REGISTRY
+
 from etl_pipeline import extractor
+from etl_pipeline.http_client import ExtractionClient, CircuitBreaker
+from etl_pipeline.metrics import timed
 from etl_pipeline.models import User
 
 # A sample valid user record.
@@ -33,3 +45,161 @@ def test_validate_data():
     assert len(valid_users) == 1, f"Expected 1 valid user, got {len(valid_users)}"
     user: User = valid_users[0]
     assert user.user_id == 1
+
+def test_validate_data_records_its_throughput():
+    records_before = REGISTRY.get_sample_value("stage_records_total", {"stage": "validate"}) or 0
+    extractor.validate_data([valid_user, valid_user], extraction_ts=0)
+    assert REGISTRY.get_sample_value("stage_records_total", {"stage": "validate"}) - records_before == 2
+    assert REGISTRY.get_sample_value("stage_records_per_second", {"stage": "validate"}) > 0
+
+def test_timed_decorator_times_concurrent_calls_separately():
+    @timed("test_concurrent_calls")
+    def slow(delay):
+        time.sleep(delay)
+        return [delay]
+
+    # The second call starts while the first is running; a timer shared by both calls would
+    # measure the first one from the start of the second.
+    first = threading.Thread(target=slow, args=(0.2,))
+    first.start()
+    time.sleep(0.1)
+    slow(0.2)
+    first.join()
+    labels = {"stage": "test_concurrent_calls"}
+    assert REGISTRY.get_sample_value("stage_duration_seconds_count", labels) == 2
+    assert REGISTRY.get_sample_value("stage_duration_seconds_sum", labels) >= 0.38
+    assert REGISTRY.get_sample_value("stage_records_total", labels) == 2
+
+@pytest.fixture
+def api_server():
+    """
+    Local stand-in for the users API. Each request pops the next status code from
+    server.statuses (200 once the list is empty) and records it in server.hits.
+    When server.etag is set it is sent as the ETag and a matching If-None-Match gets a 304.
+    The body is server.routes[path] when the path has a route, server.users otherwise.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+            if status == 200 and self.server.etag and self.headers.get("If-None-Match") == self.server.etag:
+                status = 304
+            self.server.hits.append(status)
+            payload = self.server.routes.get(self.path, self.server.users)
+            body = json.dumps(payload).encode() if status == 200 else b"" if status == 304 else b"error"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if self.server.etag:
+                self.send_header("ETag", self.server.etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.statuses = []
+    server.hits = []
+    server.etag = None
+    server.users = [valid_user]
+    server.routes = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_data_retries_transient_errors(api_server, monkeypatch):
+    monkeypatch.setattr(extractor, "API_URL", f"http://127.0.0.1:{api_server.server_port}/users")
+    api_server.statuses = [503, 502]
+    client = ExtractionClient(max_retries=3, backoff_base=0.001)
+    data = extractor.fetch_data(client)
+    assert data == [valid_user]
+    assert api_server.hits == [503, 502, 200], "Client should retry until the API recovers."
+
+def test_circuit_breaker_short_circuits(api_server, monkeypatch):
+    monkeypatch.setattr(extractor, "API_URL", f"http://127.0.0.1:{api_server.server_port}/users")
+    api_server.statuses = [500] * 10
+    client = ExtractionClient(max_retries=1, backoff_base=0.001, breaker_threshold=2, breaker_reset=60)
+    assert extractor.fetch_data(client) is None
+    assert extractor.fetch_data(client) is None
+    assert client.breaker(extractor.API_URL).state == "open"
+    hits_before = len(api_server.hits)
+    assert extractor.fetch_data(client) is None
+    assert len(api_server.hits) == hits_before, "Open breaker should not send requests."
+    # Other endpoints have their own breaker.
+    assert client.breaker(f"http://127.0.0.1:{api_server.server_port}/photos").state == "closed"
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow(), "Only one trial request while half open."
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
+
+def test_snapshot_fetcher_conditional_get(api_server):
+    fetcher = extractor.SnapshotFetcher(ExtractionClient(), f"http://127.0.0.1:{api_server.server_port}/users")
+    api_server.etag = '"v1"'
+    snapshot = fetcher.fetch()
+    assert snapshot.changed and snapshot.data == [valid_user]
+    # Not accepted yet (e.g. the insert failed): the same snapshot is fetched again in full.
+    assert fetcher.fetch().changed
+    fetcher.accept(snapshot)
+    unchanged = fetcher.fetch()
+    assert not unchanged.changed and unchanged.data is None
+    assert api_server.hits == [200, 200, 304]
+    # A new validator with a byte-identical body is still caught by the payload hash.
+    api_server.etag = '"v2"'
+    assert not fetcher.fetch().changed
+    api_server.etag = '"v3"'
+    api_server.users = [{**valid_user, "phone": "555"}]
+    assert fetcher.fetch().changed
+
+def test_snapshot_fetcher_payload_hash(api_server):
+    fetcher = extractor.SnapshotFetcher(ExtractionClient(), f"http://127.0.0.1:{api_server.server_port}/users")
+    fetcher.accept(fetcher.fetch())
+    assert not fetcher.fetch().changed, "A byte-identical body without validators should be detected by its hash."
+    api_server.users = [{**valid_user, "phone": "555"}]
+    snapshot = fetcher.fetch()
+    assert snapshot.changed and snapshot.data[0]["phone"] == "555"
+
+def test_fetch_resources_concurrently(api_server, tmp_path, monkeypatch):
+    base_url = f"http://127.0.0.1:{api_server.server_port}"
+    monkeypatch.setattr(extractor, "API_BASE_URL", base_url)
+    monkeypatch.setattr(extractor, "API_URL", f"{base_url}/users")
+    photos = [{"albumId": 1, "id": i, "title": "t", "url": "u", "thumbnailUrl": "th"} for i in range(1, 5001)]
+    api_server.routes = {
+        "/photos": photos,
+        # One invalid post (no title): counted, but still kept in the raw layer.
+        "/posts": [{"userId": 1, "id": 1, "title": "t", "body": "b"}, {"userId": 1, "id": 2, "body": "b"}],
+    }
+    invalid_before = REGISTRY.get_sample_value("resource_invalid_records_total", {"resource": "posts"}) or 0
+    fetchers = {name: extractor.SnapshotFetcher(ExtractionClient(), resource=name) for name in ("users", "posts", "photos")}
+    resources = {name: fetcher.resource._replace(raw_dir=str(tmp_path / name)) for name, fetcher in fetchers.items()}
+    for name, fetcher in fetchers.items():
+        fetcher.resource = resources[name]
+
+    results = extractor.fetch_resources(
+        fetchers, store=lambda fetcher, snapshot: extractor.store_resource_snapshot(fetcher, snapshot, 1234567890)
+    )
+    assert os.path.basename(results["photos"]) == "raw_photos_1234567890.json"
+    assert os.path.basename(results["users"]) == "raw_data_1234567890.json"
+    with open(results["photos"]) as f:
+        assert len(json.load(f)) == 5000
+    assert REGISTRY.get_sample_value("resource_invalid_records_total", {"resource": "posts"}) - invalid_before == 1
+    assert REGISTRY.get_sample_value("resource_requests_success_total", {"resource": "photos"}) >= 1
+    # Accepted snapshots are unchanged on the next cycle and write nothing.
+    assert extractor.fetch_resources(fetchers, store=lambda f, s: extractor.store_resource_snapshot(f, s, 1234567891)) == {
+        "users": True, "posts": True, "photos": True
+    }
+
+def test_unknown_resource_names_are_rejected():
+    assert extractor.parse_resource_names(" users, posts ,") == ["users", "posts"]
+    with pytest.raises(ValueError, match="psots.*users, posts, comments, albums, photos, todos"):
+        extractor.parse_resource_names("users,psots")
+    with pytest.raises(ValueError):
+        extractor.SnapshotFetcher(resource="user")
@@ -1,7 +1,9 @@
 import pytest
-from sqlmodel import Session, create_engine, select
-from etl_pipeline.ingestor import process_and_insert
-from etl_pipeline.models import User
+from sqlmodel import Session, select
+from etl_pipeline.extractor import Snapshot
+from etl_pipeline.ingestor import process_and_insert, bulk_insert, ingest_snapshot, ChangeTracker, AdaptiveSchedule, poll_once
+from etl_pipeline.ingestor import DimensionCache, check_schema, make_engine, replay_dead_letters
+from etl_pipeline.models import User, Address, Geo, Company, UserVersion, SnapshotHeartbeat, DeadLetter
 
 # A valid user record resembling data from the API.
 valid_user = {
@@ -30,7 +32,7 @@ valid_user = {
 
 @pytest.fixture
 def session():
-    engine = create_engine("sqlite://", echo=False)
+    engine = make_engine("sqlite://")
     from sqlmodel import SQLModel
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
@@ -58,3 +60,152 @@ def test_process_and_insert(session):
     
     assert user.company is not None, "Company should be inserted."
     assert user.company.name == valid_user["company"]["name"], "Company name should match."
+
+def test_bulk_insert(session):
+    extraction_ts = 1234567890
+    second_user = {**valid_user, "id": 2, "username": "Antonette", "company": None}
+    stats = bulk_insert(session, [valid_user, second_user], extraction_ts)
+    session.commit()
+
+    assert stats["user"]["rows"] == 2
+    # Both users live at the same address: one content-addressed address and geo row.
+    assert (stats["address"]["rows"], stats["address"]["cached"]) == (1, 1)
+    assert stats["geo"]["rows"] == 1
+    assert stats["company"]["rows"] == 1
+    for table in ("user", "geo", "address", "company"):
+        assert stats[table]["rows_per_sec"] > 0, f"{table} should report its rows/s."
+
+    users = {user.user_id: user for user in session.exec(select(User))}
+    assert users[1].address.geo.lng == valid_user["address"]["geo"]["lng"], "Geo should be linked to the user's address."
+    assert users[1].company.name == valid_user["company"]["name"], "Company should be linked to the user."
+    assert users[2].company is None, "User without company should have no company_id."
+    assert users[2].address_id == users[1].address_id, "Identical addresses should share one row."
+
+def test_repeat_snapshots_write_no_dimension_rows(session):
+    dimensions = DimensionCache()
+    moved_user = {**valid_user, "id": 2, "address": {**valid_user["address"], "geo": {"lat": "0", "lng": "0"}}}
+    ingest_snapshot(session, [valid_user, moved_user], 100, True, dimensions=dimensions)
+    stats = bulk_insert(session, [valid_user, moved_user], 130, dimensions)
+    session.commit()
+    assert all(stats[table]["rows"] == 0 for table in ("geo", "address", "company")), "Known contents should not be written again."
+
+    # A fresh cache (e.g. after a restart) reuses the existing rows through ON CONFLICT DO NOTHING.
+    ingest_snapshot(session, [valid_user, moved_user], 160, False)
+    assert len(session.exec(select(Geo)).all()) == 2
+    assert len(session.exec(select(Address)).all()) == 2, "The moved user's address has other coordinates."
+    assert len(session.exec(select(Company)).all()) == 1
+    assert len({user.address_id for user in session.exec(select(User).where(User.user_id == 1))}) == 1
+
+def test_dimension_ids_of_a_rolled_back_snapshot_are_not_cached(session):
+    dimensions = DimensionCache()
+    bulk_insert(session, [valid_user], 100, dimensions)
+    session.rollback()
+    dimensions.discard()
+    assert ingest_snapshot(session, [valid_user], 100, True, dimensions=dimensions) == 1
+    user = session.exec(select(User)).one()
+    assert user.company.name == valid_user["company"]["name"]
+    assert user.address.geo.lat == valid_user["address"]["geo"]["lat"]
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_ingest_snapshot_cdc(session, bulk):
+    tracker = ChangeTracker()
+    second_user = {**valid_user, "id": 2, "username": "Antonette"}
+    assert ingest_snapshot(session, [valid_user, second_user], 100, bulk, tracker) == 2
+    # An identical snapshot writes no user rows, only a heartbeat.
+    assert ingest_snapshot(session, [valid_user, second_user], 130, bulk, tracker) == 0
+    # One changed user is written as a new version; user 2 disappears from the API.
+    changed_user = {**valid_user, "email": "new@april.biz"}
+    assert ingest_snapshot(session, [changed_user], 160, bulk, tracker) == 1
+
+    assert [(u.user_id, u.extraction_ts) for u in session.exec(select(User).order_by(User.extraction_ts, User.user_id))] == [
+        (1, 100), (2, 100), (1, 160)
+    ]
+    versions = {(v.user_id, v.valid_from): v.valid_to for v in session.exec(select(UserVersion))}
+    assert versions == {(1, 100): 160, (2, 100): 160, (1, 160): None}
+    heartbeats = {h.extraction_ts: (h.changed, h.unchanged, h.removed) for h in session.exec(select(SnapshotHeartbeat))}
+    assert heartbeats == {100: (2, 0, 0), 130: (0, 2, 0), 160: (1, 0, 1)}
+
+    # A restarted ingestor reloads the current versions from the database.
+    restarted = ChangeTracker()
+    assert ingest_snapshot(session, [changed_user], 190, bulk, restarted) == 0
+
+def test_adaptive_schedule():
+    schedule = AdaptiveSchedule(min_interval=5, max_interval=30, factor=2)
+    assert [schedule.idle() for _ in range(4)] == [10, 20, 30, 30]
+    assert schedule.changed() == 5
+
+def test_poll_once_skips_unchanged_snapshots(session, tmp_path, monkeypatch):
+    from etl_pipeline import extractor
+    monkeypatch.setattr(extractor, "RAW_DIR", str(tmp_path))
+
+    class StubFetcher(extractor.SnapshotFetcher):
+        def __init__(self, snapshots):
+            super().__init__()
+            self.snapshots = snapshots
+
+        def fetch(self):
+            return self.snapshots.pop(0)
+
+    changed = Snapshot([valid_user], True, None, None, "hash")
+    fetcher = StubFetcher([changed, Snapshot(None, False, None, None, "hash")])
+    schedule = AdaptiveSchedule(min_interval=5, max_interval=60, factor=2)
+    assert poll_once(session, {"users": fetcher}, schedule, bulk=True) == 5
+    assert poll_once(session, {"users": fetcher}, schedule, bulk=True) == 10
+    assert len(session.exec(select(User)).all()) == 1
+    assert len(list(tmp_path.rglob("raw_data_*"))) == 1
+    heartbeat = session.exec(select(SnapshotHeartbeat)).one()
+    assert (heartbeat.total, heartbeat.changed, heartbeat.unchanged) == (1, 0, 1)
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_bad_records_are_dead_lettered_and_the_rest_inserted(session, bulk):
+    users = [{**valid_user, "id": i, "username": f"user{i}"} for i in range(1, 11)]
+    users[3] = {**users[3], "name": None}  # rejected by the database (NOT NULL)
+    users[6] = {**users[6], "id": 2}  # duplicate primary key within the snapshot
+    users.append({"username": "no id"})  # invalid before reaching the database
+    assert ingest_snapshot(session, users, 100, bulk, chunk_size=4) == 8
+
+    assert sorted(u.user_id for u in session.exec(select(User))) == [1, 2, 3, 5, 6, 8, 9, 10]
+    letters = {letter.user_id: letter for letter in session.exec(select(DeadLetter))}
+    assert sorted(letters, key=str) == [2, 4, None]
+    assert letters[4].record["name"] is None and letters[4].extraction_ts == 100
+    assert letters[None].error.startswith("Invalid record")
+
+def test_replay_dead_letters(session):
+    ingest_snapshot(session, [valid_user], 100)
+    # The same user at the same extraction_ts conflicts with the row already stored.
+    ingest_snapshot(session, [{**valid_user, "email": "new@april.biz"}], 100, bulk=True)
+    letter = session.exec(select(DeadLetter)).one()
+    assert replay_dead_letters(session) == (0, 1)
+    assert letter.attempts == 2 and letter.replayed_at is None
+
+    session.delete(session.exec(select(User)).one())
+    session.commit()
+    assert replay_dead_letters(session, bulk=True) == (1, 0)
+    assert session.exec(select(User)).one().email == "new@april.biz"
+    assert replay_dead_letters(session) == (0, 0), "Replayed letters should not be retried."
+
+def test_session_is_usable_after_a_failed_commit(session, monkeypatch):
+    commit = session.commit
+
+    def failing_commit():
+        monkeypatch.setattr(session, "commit", commit)
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(session, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        ingest_snapshot(session, [valid_user], 100, bulk=True)
+    assert ingest_snapshot(session, [valid_user], 130, bulk=True) == 1
+    assert [u.extraction_ts for u in session.exec(select(User))] == [130]
+
+def test_outdated_schema_is_reported_before_any_insert():
+    from sqlalchemy import text
+    from sqlmodel import SQLModel
+    engine = make_engine("sqlite://")
+    with engine.begin() as connection:
+        # geo as created before the content-addressed dimensions.
+        connection.execute(text("CREATE TABLE geo (id INTEGER PRIMARY KEY, lat VARCHAR, lng VARCHAR, address_id INTEGER)"))
+    with pytest.raises(RuntimeError, match=r"geo \(missing content_hash\)"):
+        check_schema(engine, SQLModel.metadata)
+    fresh = make_engine("sqlite://")
+    SQLModel.metadata.create_all(fresh)
+    check_schema(fresh, SQLModel.metadata)
@@ -0,0 +1,22 @@
+import io
+import json
+
+import pytest
+
+from etl_pipeline.jsonstream import iter_json_array
+
+def test_iter_json_array_matches_json_load():
+    data = [{"id": i, "name": f"user {i}", "nested": {"values": [1, 2.5, None, True]}} for i in range(20)]
+    data += [12345, "text with ] and , inside", [], {}]
+    text = json.dumps(data, indent=2)
+    # A tiny chunk size forces elements and numbers to be split across reads.
+    assert list(iter_json_array(io.StringIO(text), chunk_size=3)) == data
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array(io.StringIO("  [ ]  "))) == []
+
+def test_iter_json_array_rejects_non_arrays():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"id": 1}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"id": 1}, {"id": 2}'), chunk_size=4))
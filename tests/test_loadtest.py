@@ -0,0 +1,44 @@
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from etl_pipeline import extractor
+from etl_pipeline.http_client import ExtractionClient
+from etl_pipeline.loadtest import StandInAPI, percentiles, run_load_test
+
+def test_percentiles():
+    assert percentiles(list(range(1, 101))) == {"p50": 50, "p95": 95, "p99": 99}
+    assert percentiles([]) == {"p50": None, "p95": None, "p99": None}
+
+def test_fetch_data_retries_truncated_body():
+    # Every other request is cut short; the client must retry rather than hand back a partial body.
+    with StandInAPI(users=50, truncate_rate=0.5, seed=1) as api:
+        client = ExtractionClient(max_retries=10, backoff_base=0)
+        data = extractor.fetch_data(client, api.url)
+        client.close()
+    assert data is not None and len(data) == 50
+    assert api.requests == api.truncated_served + 1
+
+def test_run_load_test(tmp_path):
+    with StandInAPI(users=20, error_rate=0.3, seed=2) as api:
+        client = ExtractionClient(max_retries=10, backoff_base=0)
+        report = run_load_test(api, snapshots=5, raw_dir=str(tmp_path), client=client)
+        client.close()
+    assert report["succeeded"] == 5 and report["failed"] == 0
+    assert report["requests_served"] == 5 + report["errors_injected"]
+    assert report["latency_seconds"]["total"]["p99"] > 0
+    assert report["snapshots_per_min"] > 0
+    assert len(list(tmp_path.rglob("raw_data_*"))) == 5
+
+def test_concurrent_requests_are_all_counted():
+    with StandInAPI(users=5, error_rate=0.5, seed=3) as api:
+        def get():
+            try:
+                urllib.request.urlopen(api.url).read()
+            except urllib.error.HTTPError:
+                pass
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: get(), range(200)))
+    assert api.requests == 200
+    assert 0 < api.errors_served < 200
@@ -0,0 +1,66 @@
+import json
+import logging
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+from prometheus_client import REGISTRY
+
+from etl_pipeline import logger as etl_logger
+from etl_pipeline.logger import DroppingQueueHandler, JsonFormatter, RateLimitFilter, get_logger
+
+def make_record(msg="processed %s", args=(1,), level=logging.INFO, lineno=10, created=1000.0, **extra):
+    record = logging.LogRecord("etl_pipeline.test", level, __file__, lineno, msg, args, None)
+    record.created = created
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record(user_id=7)))
+    assert entry["message"] == "processed 1"
+    assert entry["level"] == "INFO" and entry["logger"] == "etl_pipeline.test"
+    assert entry["user_id"] == 7
+
+def test_rate_limit_filter_per_call_site():
+    limiter = RateLimitFilter(rate=2)
+    assert [limiter.filter(make_record()) for _ in range(4)] == [True, True, False, False]
+    # Another call site and warnings are not limited.
+    assert limiter.filter(make_record(lineno=11))
+    assert limiter.filter(make_record(level=logging.WARNING))
+    # The next window lets records through again and reports the suppressed ones.
+    record = make_record(created=1001.5)
+    assert limiter.filter(record) and record.suppressed == 2
+
+def test_queue_handler_drops_instead_of_blocking():
+    dropped_before = REGISTRY.get_sample_value("log_records_dropped_total")
+    handler = DroppingQueueHandler(queue.SimpleQueue(), maxsize=2)
+    for i in range(5):
+        handler.handle(make_record(args=(i,)))
+    assert handler.dropped == 3
+    assert REGISTRY.get_sample_value("log_records_dropped_total") - dropped_before == 3
+    record = handler.queue.get_nowait()
+    assert record.getMessage() == "processed 0" and record.args is None
+
+    # The drops are reported ahead of the next record that fits.
+    handler.queue.get_nowait()
+    handler.handle(make_record(args=(5,)))
+    warning = handler.queue.get_nowait()
+    assert warning.levelno == logging.WARNING and warning.dropped == 3
+    assert handler.queue.get_nowait().getMessage() == "processed 5"
+
+def test_queue_handler_always_enqueues_warnings():
+    handler = DroppingQueueHandler(queue.SimpleQueue(), maxsize=1)
+    handler.handle(make_record())
+    handler.handle(make_record(msg="failed %s", level=logging.ERROR))
+    assert handler.dropped == 0
+    assert [record.getMessage() for record in (handler.queue.get_nowait(), handler.queue.get_nowait())] == ["processed 1", "failed 1"]
+
+def log_in_worker(message):
+    get_logger("etl_pipeline.test_worker").error(message)
+
+def test_forked_worker_records_are_written():
+    get_logger("etl_pipeline.test_worker")  # the parent's listener is running before the fork
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as executor:
+        executor.submit(log_in_worker, "logged from a forked worker").result()
+    with open(etl_logger.LOG_FILE) as f:
+        assert "logged from a forked worker" in f.read()
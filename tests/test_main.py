@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+from etl_pipeline.metrics import metrics_port
+
+def test_main_imports_no_mode_module():
+    code = (
+        "import sys, etl_pipeline.main\n"
+        "print(sorted(m for m in ('etl_pipeline.ingestor', 'etl_pipeline.transform', 'etl_pipeline.compactor', 'sqlmodel') if m in sys.modules))"
+    )
+    env = dict(os.environ, LOG_FILE="")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert result.stdout.strip() == "[]"
+
+def test_metrics_port_per_mode(monkeypatch):
+    assert metrics_port("ingestor") == 8000
+    assert metrics_port("transformer") == 8001
+    monkeypatch.setenv("METRICS_PORT_TRANSFORMER", "9101")
+    assert metrics_port("transformer") == 9101
+    assert metrics_port("compactor") == 8002
@@ -0,0 +1,53 @@
+import os
+from datetime import datetime, timezone
+
+from etl_pipeline import transform
+from etl_pipeline.compactor import commit_marker_path
+from etl_pipeline.manifest import Manifest, DONE, FAILED
+
+def write_raw_file(raw_dir, ts):
+    partition = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
+    folder = os.path.join(str(raw_dir), partition)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"raw_data_{ts}.json")
+    with open(path, "w") as f:
+        f.write("[]")
+    return path
+
+def test_manifest_tracks_new_files(tmp_path):
+    raw_dir = tmp_path / "raw"
+    manifest = Manifest(str(tmp_path / "manifest.db"))
+    first = write_raw_file(raw_dir, 1234567890)
+    assert manifest.discover(str(raw_dir), transform.RAW_FILE_PATTERN, transform.extract_timestamp) == 1
+    assert manifest.pending() == [(first, 1234567890)]
+
+    manifest.mark(first, 1234567890, DONE, ["out.csv"])
+    # A file landing in a later partition is found; already known files are not registered again.
+    second = write_raw_file(raw_dir, 1234567890 + 7200)
+    assert manifest.discover(str(raw_dir), transform.RAW_FILE_PATTERN, transform.extract_timestamp) == 1
+    assert manifest.pending() == [(second, 1234567890 + 7200)]
+
+    manifest.mark(second, 1234567890 + 7200, FAILED)
+    assert manifest.pending() == [(second, 1234567890 + 7200)], "Failed files should be retried."
+
+def test_manifest_rebuilt_from_disk(tmp_path):
+    raw_dir = tmp_path / "raw"
+    processed_dir = tmp_path / "processed"
+    done_file = write_raw_file(raw_dir, 1234567890)
+    todo_file = write_raw_file(raw_dir, 1234567891)
+    for output in transform.expected_output_files(1234567890, str(processed_dir)) + [commit_marker_path(str(processed_dir), 1234567890)]:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w") as f:
+            f.write("dummy")
+
+    manifest = Manifest(str(tmp_path / "manifest.db"))
+    assert manifest.is_new
+    unprocessed = transform.get_unprocessed_raw_files(str(raw_dir), str(processed_dir), manifest)
+    assert unprocessed == [(todo_file, 1234567891)]
+    assert manifest.status(done_file) == DONE
+    manifest.close()
+
+    # Reopening an existing manifest trusts its statuses instead of rescanning the outputs.
+    manifest = Manifest(str(tmp_path / "manifest.db"))
+    assert not manifest.is_new
+    assert transform.get_unprocessed_raw_files(str(raw_dir), str(processed_dir), manifest) == [(todo_file, 1234567891)]
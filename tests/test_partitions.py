@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlmodel import create_engine
+
+from etl_pipeline import partitions
+from etl_pipeline.models import User
+
+DAY = partitions.DAY
+# 2024-05-01 12:00:00 UTC
+NOW = 1714564800
+
+def test_user_table_is_range_partitioned_on_postgres_only():
+    ddl = str(CreateTable(User.__table__).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (extraction_ts)" in ddl
+    sqlite_ddl = str(CreateTable(User.__table__).compile(dialect=create_engine("sqlite://").dialect))
+    assert "PARTITION" not in sqlite_ddl
+
+def test_plan_creates_partitions_ahead():
+    create, drop = partitions.plan_partitions(["user_p20240501"], NOW, ahead=2, retention=0)
+    assert [name for name, _, _ in create] == ["user_p20240502", "user_p20240503"]
+    name, start, end = create[0]
+    assert (start, end) == (1714608000, 1714608000 + DAY)
+    assert drop == []
+
+def test_plan_drops_only_partitions_past_the_retention():
+    existing = ["user_p20240427", "user_p20240428", "user_p20240429", "user_p20240501", "user_version"]
+    _, drop = partitions.plan_partitions(existing, NOW, ahead=0, retention=2)
+    # 2024-04-29 ends at 04-30 00:00, only 36 hours before NOW.
+    assert drop == ["user_p20240427", "user_p20240428"]
+
+def test_multi_day_partitions():
+    create, _ = partitions.plan_partitions([], NOW, ahead=7, retention=0, days=7)
+    assert [(end - start) // DAY for _, start, end in create] == [7, 7]
+    assert create[0][1] <= NOW < create[0][2]
+
+def test_maintenance_is_a_no_op_on_sqlite():
+    assert partitions.maintain_partitions(create_engine("sqlite://"), NOW, retention=1) == ([], [])
+
+class RecordingConnection:
+    """Stands in for a PostgreSQL connection: records the statements, and the default partition holds rows in default_rows' ranges."""
+
+    def __init__(self, default_rows=()):
+        self.statements = []
+        self.default_rows = default_rows
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        found = sql.startswith('SELECT 1 FROM "user_default"') and any(params["start"] <= ts < params["end"] for ts in self.default_rows)
+        return SimpleNamespace(first=lambda: (1,) if found else None)
+
+class RecordingEngine:
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextmanager
+    def begin(self):
+        yield self.connection
+
+def test_out_of_window_rows_go_to_the_default_partition(monkeypatch):
+    monkeypatch.setattr(partitions, "_is_partitioned", lambda connection: True)
+    monkeypatch.setattr(partitions, "_existing_partitions", lambda connection: ["user_p20240501"])
+    # A replayed dead letter from a later day was inserted before its partition existed.
+    connection = RecordingConnection(default_rows=[NOW + DAY])
+    created, _ = partitions.maintain_partitions(RecordingEngine(connection), NOW, ahead=1, retention=3)
+    assert created == ["user_p20240502"]
+    statements = [sql.split(" WHERE ")[0] for sql in connection.statements]
+    assert statements == [
+        'CREATE TABLE IF NOT EXISTS "user_default" PARTITION OF "user" DEFAULT',
+        'SELECT 1 FROM "user_default"',
+        'CREATE TEMPORARY TABLE "user_p20240502_moved" (LIKE "user_default") ON COMMIT DROP',
+        'WITH moved AS (DELETE FROM "user_default"',
+        f'CREATE TABLE IF NOT EXISTS "user_p20240502" PARTITION OF "user" FOR VALUES FROM ({NOW - DAY // 2 + DAY}) TO ({NOW - DAY // 2 + 2 * DAY})',
+        'INSERT INTO "user" SELECT * FROM "user_p20240502_moved"',
+        'DELETE FROM "user_default"',
+    ]
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from etl_pipeline import raw_format, transform
+from etl_pipeline.extractor import save_raw_data
+
+records = [{"id": i, "name": f"user {i}", "address": {"geo": {"lat": "-37.3159"}}} for i in range(1, 4)]
+
+@pytest.mark.parametrize("fmt", sorted(raw_format.RAW_FORMATS))
+def test_raw_formats_round_trip(tmp_path, fmt):
+    if fmt.endswith(".zst") and raw_format.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    file_path = save_raw_data(records, 1234567890, raw_dir=str(tmp_path), fmt=fmt)
+    assert file_path is not None
+    assert os.path.basename(file_path) == raw_format.raw_file_name(1234567890, fmt)
+    assert transform.extract_timestamp(file_path) == 1234567890
+
+    for streaming in (False, True):
+        with raw_format.open_raw(file_path) as f:
+            assert list(raw_format.iter_raw_records(f, file_path, streaming)) == records
+
+def test_split_raw_file_name():
+    assert raw_format.split_raw_file_name("data/raw/raw_data_1234567890.json.gz") == (1234567890, ".json.gz")
+    assert raw_format.split_raw_file_name("raw_data_1234567890.ndjson") == (1234567890, ".ndjson")
+    assert raw_format.split_raw_file_name("raw_data_1234567890.json.tmp") is None
+    assert raw_format.split_raw_file_name("processed_user_1234567890.csv") is None
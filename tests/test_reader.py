@@ -0,0 +1,112 @@
+import os
+import time
+
+import pytest
+
+from etl_pipeline import compactor, extractor, reader, transform, writers
+from etl_pipeline.synthetic import generate_users
+
+# Two snapshots in 2021-01-01/00 and two in 2021-01-01/01 (UTC).
+TIMESTAMPS = (1609459200, 1609461000, 1609462800, 1609464600)
+
+@pytest.fixture
+def datalake(tmp_path, monkeypatch):
+    raw_dir, processed_dir = str(tmp_path / "raw"), str(tmp_path / "processed")
+    monkeypatch.setattr(transform, "RAW_DIR", raw_dir)
+    monkeypatch.setattr(transform, "PROCESSED_DIR", processed_dir)
+    monkeypatch.setattr(transform, "OUTPUT_FORMATS", {key: "csv" for key in transform.OUTPUT_MODEL_MAPPING})
+    for ts in TIMESTAMPS:
+        extractor.save_raw_data(generate_users(3, seed=ts), ts, raw_dir)
+    transform.process_files(transform.get_unprocessed_raw_files(raw_dir, processed_dir), transform.default_transformation_fn)
+    return raw_dir, processed_dir, str(tmp_path / "resources")
+
+@pytest.fixture
+def opened(monkeypatch):
+    paths = []
+    writer_for_path = reader.writer_for_path
+
+    def recording(path):
+        paths.append(path)
+        return writer_for_path(path)
+
+    monkeypatch.setattr(reader, "writer_for_path", recording)
+    return paths
+
+def test_read_records_prunes_partitions_and_files(datalake, opened):
+    records = list(reader.read_records("processed_user", start=TIMESTAMPS[1], end="2021-01-01T01:00:01",
+                                       columns=["user_id", "extraction_ts"]))
+    assert [record["extraction_ts"] for record in records] == [reader._iso(TIMESTAMPS[1])] * 3 + [reader._iso(TIMESTAMPS[2])] * 3
+    assert isinstance(records[0]["user_id"], int) and set(records[0]) == {"user_id", "extraction_ts"}
+    assert [path.rsplit("_", 1)[1] for path in opened] == [f"{TIMESTAMPS[1]}.csv", f"{TIMESTAMPS[2]}.csv"]
+
+def test_reads_are_the_same_before_and_after_compaction(datalake):
+    raw_dir, processed_dir, resources_dir = datalake
+    before = list(reader.read_records("processed_company", start=TIMESTAMPS[1]))
+    compactor.run_compaction(raw_dir, processed_dir, resources_dir, now=time.time() + 3600, grace=0)
+    assert all(snapshot.compacted for snapshot in reader.list_snapshots("processed_company"))
+    after = list(reader.read_records("processed_company", start=TIMESTAMPS[1]))
+    # Compaction sorts the rows of each snapshot by the first column; the snapshots keep their order.
+    assert [record["extraction_ts"] for record in after] == [record["extraction_ts"] for record in before]
+    assert sorted(after, key=lambda record: (record["extraction_ts"], record["company_id"])) == \
+        sorted(before, key=lambda record: (record["extraction_ts"], record["company_id"]))
+
+def test_as_of_reads_only_the_latest_snapshot(datalake):
+    raw_dir, processed_dir, resources_dir = datalake
+    compactor.run_compaction(raw_dir, processed_dir, resources_dir, now=time.time() + 3600, grace=0)
+    records = list(reader.read_records(transform.ProcessedUser, as_of=TIMESTAMPS[2] + 10))
+    assert {record["extraction_ts"] for record in records} == {reader._iso(TIMESTAMPS[2])}
+    assert len(records) == 3
+    assert reader.latest_snapshot("processed_user", as_of=TIMESTAMPS[0] - 1) is None
+    assert list(reader.read_records("processed_user", as_of=TIMESTAMPS[0] - 1)) == []
+
+def test_read_batches(datalake):
+    batches = list(reader.read_batches("processed_user", columns=["user_id"], batch_size=5))
+    assert [len(batch["user_id"]) for batch in batches] == [5, 5, 2]
+
+def test_compaction_during_a_read_is_picked_up_from_the_index(datalake):
+    raw_dir, processed_dir, resources_dir = datalake
+    records = reader.read_records("processed_user", end=TIMESTAMPS[2], columns=["extraction_ts"])
+    first = next(records)
+    # The second snapshot's file is removed by the compaction before the reader opens it.
+    compactor.run_compaction(raw_dir, processed_dir, resources_dir, now=time.time() + 3600, grace=0)
+    rest = list(records)
+    assert [record["extraction_ts"] for record in [first] + rest] == \
+        [reader._iso(TIMESTAMPS[0])] * 3 + [reader._iso(TIMESTAMPS[1])] * 3
+
+def test_uncommitted_snapshots_are_not_read(datalake):
+    raw_dir, processed_dir, resources_dir = datalake
+    # The transformer renamed the outputs of the last snapshot but crashed before its commit marker.
+    os.remove(compactor.commit_marker_path(processed_dir, TIMESTAMPS[3]))
+    assert [snapshot.ts for snapshot in reader.list_snapshots("processed_user")] == list(TIMESTAMPS[:3])
+    assert list(reader.read_records("processed_user", start=TIMESTAMPS[3])) == []
+    # The compactor leaves it alone as well, so committing it later makes it visible.
+    compactor.run_compaction(raw_dir, processed_dir, resources_dir, now=time.time() + 3600, grace=0)
+    assert TIMESTAMPS[3] not in compactor.compacted_timestamps(os.path.dirname(reader.list_snapshots("processed_user")[-1].path))
+    open(compactor.commit_marker_path(processed_dir, TIMESTAMPS[3]), "w").close()
+    assert len(list(reader.read_records("processed_user", start=TIMESTAMPS[3]))) == 3
+
+@pytest.mark.parametrize("fmt", ["colz", "parquet"])
+def test_compacted_row_groups_are_pruned_from_their_statistics(datalake, monkeypatch, fmt):
+    _, processed_dir, _ = datalake
+    if fmt == "parquet" and writers.pq is None:
+        pytest.skip("pyarrow is not installed")
+    # One row group per snapshot (3 users each).
+    monkeypatch.setattr(compactor, "COMPACT_BATCH_SIZE", 3)
+    partition = os.path.join(processed_dir, "processeduser", "2021-01-01", "00")
+    compactor.compact_processed_partition(partition, transform.ProcessedUser, fmt=fmt, now=time.time() + 3600, grace=0)
+    decisions = []
+    holds_any = reader._holds_any
+
+    def recording(wanted):
+        keep = holds_any(wanted)
+        return lambda stats: decisions.append(keep(stats)) or decisions[-1]
+
+    monkeypatch.setattr(reader, "_holds_any", recording)
+    decompressed = []
+    decompress = writers.zlib.decompress
+    monkeypatch.setattr(writers.zlib, "decompress", lambda data: decompressed.append(data) or decompress(data))
+    records = list(reader.read_records("processed_user", as_of=TIMESTAMPS[0] + 10, columns=["user_id", "extraction_ts"]))
+    assert {record["extraction_ts"] for record in records} == {reader._iso(TIMESTAMPS[0])} and len(records) == 3
+    assert decisions == [True, False], "The second snapshot's row group should be skipped."
+    if fmt == "colz":
+        assert len(decompressed) == 2, "Only the two requested chunks of the kept row group should be decompressed."
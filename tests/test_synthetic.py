@@ -0,0 +1,12 @@
+from etl_pipeline import extractor
+from etl_pipeline.synthetic import generate_users, iter_users
+
+def test_generator_is_seeded():
+    assert generate_users(50, seed=7) == list(iter_users(50, seed=7))
+    assert generate_users(50, seed=7) != generate_users(50, seed=8)
+
+def test_generated_users_are_valid():
+    users = generate_users(20, companies=3)
+    assert [user["id"] for user in users] == list(range(1, 21))
+    assert len(extractor.validate_data(users)) == 20
+    assert len({user["company"]["name"] for user in users}) <= 3
@@ -1,11 +1,14 @@
 import os
 import json
 import csv
+import multiprocessing
 from datetime import datetime, timezone
 
 import pytest
+from prometheus_client import REGISTRY
 
-from etl_pipeline import transform
+from etl_pipeline import transform, writers
+from etl_pipeline.compactor import commit_marker_path
 from etl_pipeline.models import ProcessedCompany, ProcessedUser
 
 # Sample raw record matching the expected API schema.
@@ -88,13 +91,13 @@ def test_generic_transform_and_write(setup_dirs):
     # Verify CSV headers for company output.
     with open(company_output_file, newline="") as csvfile:
         reader = csv.DictReader(csvfile)
-        expected_headers = list(ProcessedCompany.__fields__.keys())
+        expected_headers = list(ProcessedCompany._fields)
         assert reader.fieldnames == expected_headers, f"Company CSV headers mismatch: {reader.fieldnames} != {expected_headers}"
     
     # Verify CSV headers for user output.
     with open(user_output_file, newline="") as csvfile:
         reader = csv.DictReader(csvfile)
-        expected_headers = list(ProcessedUser.__fields__.keys())
+        expected_headers = list(ProcessedUser._fields)
         assert reader.fieldnames == expected_headers, f"User CSV headers mismatch: {reader.fieldnames} != {expected_headers}"
 
 def test_get_unprocessed_raw_files(setup_dirs):
@@ -114,8 +117,235 @@ def test_get_unprocessed_raw_files(setup_dirs):
         dummy_file = os.path.join(out_dir, f"processed_{model_cls.path_name}_{extraction_ts1}.csv")
         with open(dummy_file, "w") as f:
             f.write("dummy")
+    marker = commit_marker_path(str(processed_dir), extraction_ts1)
+    os.makedirs(os.path.dirname(marker))
+    open(marker, "w").close()
     
     unprocessed = transform.get_unprocessed_raw_files(str(raw_dir), str(processed_dir))
     ts_values = [ts for _, ts in unprocessed]
     assert extraction_ts2 in ts_values, "File2 should be unprocessed"
     assert extraction_ts1 not in ts_values, "File1 should be marked as processed"
+
+def test_generic_transform_streaming(setup_dirs, monkeypatch):
+    raw_dir, processed_dir = setup_dirs
+    extraction_ts = 1234567890
+    partition = datetime.fromtimestamp(extraction_ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
+    records = [dict(sample_raw_data[0], id=i) for i in range(1, 6)]
+    raw_file = raw_dir / f"raw_data_{extraction_ts}.json"
+    with raw_file.open("w") as f:
+        json.dump(records, f, indent=2)
+
+    # Force streaming mode and flush every two records.
+    monkeypatch.setattr(transform, "STREAMING_THRESHOLD_BYTES", 0)
+    monkeypatch.setattr(transform, "STREAMING_BATCH_SIZE", 2)
+    transform.generic_transform(str(raw_file), extraction_ts, transform.default_transformation_fn)
+
+    user_output_file = os.path.join(
+        str(processed_dir),
+        ProcessedUser.path_name,
+        partition,
+        f"processed_{ProcessedUser.path_name}_{extraction_ts}.csv"
+    )
+    with open(user_output_file, newline="") as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert [int(row["user_id"]) for row in rows] == [1, 2, 3, 4, 5], "Batched flushes should write every record exactly once."
+
+def test_process_files_with_worker_pool(setup_dirs):
+    raw_dir, processed_dir = setup_dirs
+    unprocessed = []
+    for ts in (1234567890, 1234567891, 1234567892):
+        raw_file = raw_dir / f"raw_data_{ts}.json"
+        with raw_file.open("w") as f:
+            json.dump(sample_raw_data, f)
+        unprocessed.append((str(raw_file), ts))
+    broken_file = raw_dir / "raw_data_1234567893.json"
+    broken_file.write_text("[{")
+    unprocessed.append((str(broken_file), 1234567893))
+
+    success_before = REGISTRY.get_sample_value("transform_success_total")
+    failure_before = REGISTRY.get_sample_value("transform_failure_total")
+    with transform.worker_pool(2) as executor:
+        stats = transform.process_files(unprocessed, transform.default_transformation_fn, executor=executor)
+
+    assert stats["files"] == 4
+    assert stats["records"] == 3
+    assert REGISTRY.get_sample_value("transform_success_total") - success_before == 3
+    assert REGISTRY.get_sample_value("transform_failure_total") - failure_before == 1, "Each file should count exactly once."
+    for _, ts in unprocessed[:3]:
+        assert all(os.path.exists(output) for output in transform.expected_output_files(ts, str(processed_dir)))
+
+@pytest.mark.parametrize("start_method", ["spawn", "forkserver"])
+def test_worker_pool_passes_settings_to_spawned_workers(setup_dirs, monkeypatch, start_method):
+    raw_dir, processed_dir = setup_dirs
+    monkeypatch.setattr(transform, "OUTPUT_FORMATS", dict(transform.OUTPUT_FORMATS))
+    monkeypatch.setattr(transform, "COMPANY_DEDUP", "off")
+    transform.set_output_format("colz")
+    raw_file = raw_dir / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps(sample_raw_data + sample_raw_data))
+
+    with transform.worker_pool(1, multiprocessing.get_context(start_method)) as executor:
+        transform.process_files([(str(raw_file), 1234567890)], transform.default_transformation_fn, executor=executor)
+    outputs = transform.expected_output_files(1234567890, str(processed_dir))
+    assert all(output.endswith(".colz") and os.path.exists(output) for output in outputs)
+    company_output = next(output for output in outputs if ProcessedCompany.path_name in output)
+    assert writers.ColzWriter.read_footer(company_output)["rows"] == 2, "COMPANY_DEDUP=off should keep both rows."
+
+def read_company_rows(processed_dir, extraction_ts):
+    partition = datetime.fromtimestamp(extraction_ts, tz=timezone.utc).strftime("%Y-%m-%d/%H")
+    company_output_file = os.path.join(
+        str(processed_dir),
+        ProcessedCompany.path_name,
+        partition,
+        f"processed_{ProcessedCompany.path_name}_{extraction_ts}.csv"
+    )
+    with open(company_output_file, newline="") as csvfile:
+        return list(csv.DictReader(csvfile))
+
+@pytest.mark.parametrize("mode, expected_rows", [
+    ("off", [3, 3, 3]),
+    ("extraction", [1, 1, 1]),
+    ("changes", [1, 0, 1]),
+])
+def test_company_dimension_dedup(setup_dirs, monkeypatch, mode, expected_rows):
+    raw_dir, processed_dir = setup_dirs
+    monkeypatch.setattr(transform, "COMPANY_DEDUP", mode)
+    monkeypatch.setattr(transform, "_company_dimension", None)
+    # Three employees of the same company; the company's catchPhrase changes in the third snapshot.
+    snapshots = []
+    for catch_phrase in ("Multi-layered client-server neural-net", "Multi-layered client-server neural-net", "New phrase"):
+        company = dict(sample_raw_data[0]["company"], catchPhrase=catch_phrase)
+        snapshots.append([dict(sample_raw_data[0], id=i, company=company) for i in (1, 2, 3)])
+
+    for offset, records in enumerate(snapshots):
+        extraction_ts = 1234567890 + offset
+        raw_file = raw_dir / f"raw_data_{extraction_ts}.json"
+        raw_file.write_text(json.dumps(records))
+        assert transform.generic_transform(str(raw_file), extraction_ts, transform.default_transformation_fn) is not None
+        assert len(read_company_rows(processed_dir, extraction_ts)) == expected_rows[offset]
+
+def test_batch_transformation_matches_per_record(setup_dirs, monkeypatch):
+    raw_dir, processed_dir = setup_dirs
+    monkeypatch.setattr(transform, "STREAMING_BATCH_SIZE", 2)
+    records = [dict(sample_raw_data[0], id=i) for i in range(1, 6)]
+    records.append({"id": 99, "name": "missing fields"})
+    raw_file = raw_dir / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps(records))
+
+    contents = {}
+    for name, batch_fn, streaming in [
+        ("record", None, False),
+        ("batch", transform.default_batch_transformation_fn, False),
+        ("streamed batches", transform.default_batch_transformation_fn, True),
+    ]:
+        result = transform.transform_file(str(raw_file), 1234567890, transform.default_transformation_fn, streaming, batch_fn)
+        assert result["records"] == 6
+        assert result["record_errors"] == 1, f"{name}: the incomplete record should be counted as an error"
+        contents[name] = [open(path).read() for path in sorted(result["outputs"])]
+    assert contents["batch"] == contents["record"]
+    assert contents["streamed batches"] == contents["record"]
+
+def test_batch_transformation_falls_back_per_record(setup_dirs):
+    raw_dir, processed_dir = setup_dirs
+    raw_file = raw_dir / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps(sample_raw_data))
+
+    def broken_batch_fn(records, extraction_ts):
+        raise RuntimeError("boom")
+
+    result = transform.transform_file(str(raw_file), 1234567890, transform.default_transformation_fn, batch_fn=broken_batch_fn)
+    assert result["outputs"] is not None and result["record_errors"] == 0
+    user_file = transform.output_file_path("processed_user", 1234567890, str(processed_dir))
+    with open(user_file, newline="") as csvfile:
+        assert [row["username"] for row in csv.DictReader(csvfile)] == ["Bret"]
+
+def test_stage_metrics_and_backlog(setup_dirs):
+    raw_dir, _ = setup_dirs
+    raw_file = raw_dir / "raw_data_1609459200.json"
+    raw_file.write_text(json.dumps(sample_raw_data * 3))
+    count_before = REGISTRY.get_sample_value("stage_duration_seconds_count", {"stage": "transform_file"}) or 0
+    records_before = REGISTRY.get_sample_value("stage_records_total", {"stage": "transform_file"}) or 0
+
+    transform.update_backlog([(str(raw_file), 1609459200)], now=1609459260)
+    assert REGISTRY.get_sample_value("transform_backlog_files") == 1
+    assert REGISTRY.get_sample_value("transform_backlog_oldest_age_seconds") == 60
+    stats = transform.process_files([(str(raw_file), 1609459200)], transform.default_transformation_fn)
+
+    assert stats["records"] == 3
+    assert REGISTRY.get_sample_value("stage_duration_seconds_count", {"stage": "transform_file"}) - count_before == 1
+    assert REGISTRY.get_sample_value("stage_records_total", {"stage": "transform_file"}) - records_before == 3
+    assert REGISTRY.get_sample_value("payload_bytes_sum", {"stage": "transform_file"}) >= raw_file.stat().st_size
+    assert REGISTRY.get_sample_value("stage_records_per_second", {"stage": "transform_batch"}) > 0
+    transform.update_backlog([])
+    assert REGISTRY.get_sample_value("transform_backlog_files") == 0
+    assert REGISTRY.get_sample_value("transform_backlog_oldest_age_seconds") == 0
+
+def test_failed_outputs_leave_nothing_behind(setup_dirs, monkeypatch):
+    raw_dir, processed_dir = setup_dirs
+    raw_file = raw_dir / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps(sample_raw_data))
+    write_rows = writers._CsvSink.write_rows
+
+    def failing_user_rows(sink, rows):
+        if "processeduser" in sink.file_path:
+            raise OSError("disk full")
+        return write_rows(sink, rows)
+
+    monkeypatch.setattr(writers._CsvSink, "write_rows", failing_user_rows)
+    assert transform.generic_transform(str(raw_file), 1234567890, transform.default_transformation_fn) is None
+    # Neither the company output, written fine, nor any temporary file is left: the outputs are a unit.
+    assert [name for _, _, names in os.walk(processed_dir) for name in names] == []
+
+    monkeypatch.setattr(writers._CsvSink, "write_rows", write_rows)
+    outputs = transform.generic_transform(str(raw_file), 1234567890, transform.default_transformation_fn)
+    assert sorted(os.path.basename(path) for path in outputs) == [
+        "processed_processedcompany_1234567890.csv", "processed_processeduser_1234567890.csv"
+    ]
+    assert sorted(name for _, _, names in os.walk(processed_dir) for name in names) == sorted(
+        [str(1234567890)] + [os.path.basename(path) for path in outputs]
+    ), "Only the outputs and their commit marker should be left."
+
+def test_outputs_committed_before_a_crash_are_not_redone(setup_dirs, monkeypatch):
+    from etl_pipeline.manifest import DONE, Manifest
+
+    raw_dir, processed_dir = setup_dirs
+    manifest = Manifest(str(raw_dir.parent / "manifest.db"))
+    manifest.is_new = False
+    for ts in (1234567890, 1234567891):
+        (raw_dir / f"raw_data_{ts}.json").write_text(json.dumps(sample_raw_data))
+    # The transformer committed the first file's outputs, then died before updating the manifest.
+    transform.transform_file(str(raw_dir / "raw_data_1234567890.json"), 1234567890, transform.default_transformation_fn)
+
+    unprocessed = transform.get_unprocessed_raw_files(str(raw_dir), str(processed_dir), manifest)
+    assert [ts for _, ts in unprocessed] == [1234567891]
+    assert manifest.status(str(raw_dir / "raw_data_1234567890.json")) == DONE
+
+def test_failed_commit_removes_renamed_outputs(setup_dirs, monkeypatch):
+    raw_dir, processed_dir = setup_dirs
+    raw_file = raw_dir / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps(sample_raw_data))
+    replace = os.replace
+    calls = []
+
+    def failing_second_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        replace(src, dst)
+
+    monkeypatch.setattr(transform.os, "replace", failing_second_replace)
+    assert transform.generic_transform(str(raw_file), 1234567890, transform.default_transformation_fn) is None
+    # The output renamed before the failure is removed too: no snapshot is ever half visible.
+    assert [name for _, _, names in os.walk(processed_dir) for name in names] == []
+    assert transform.get_unprocessed_raw_files(str(raw_dir), str(processed_dir)) == [(str(raw_file), 1234567890)]
+
+def test_generic_write_publishes_a_commit_marker(tmp_path):
+    from etl_pipeline import reader
+
+    processed_dir = str(tmp_path / "processed")
+    user = ProcessedUser(user_id=1, username="Bret", phone="1-770", email="bret@example.org", website="example.org",
+                         company_id=None, extraction_ts="2021-01-01T00:00:00+00:00")
+    file_path = transform.generic_write_csv(ProcessedUser, [user], 1609459200, processed_dir)
+    assert os.path.exists(file_path)
+    assert os.path.exists(commit_marker_path(processed_dir, 1609459200))
+    records = list(reader.read_records("processed_user", processed_dir=processed_dir))
+    assert [record["username"] for record in records] == ["Bret"]
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+from etl_pipeline import extractor
+from etl_pipeline.transform import RAW_FILE_PATTERN
+from etl_pipeline.watcher import InotifyWatcher, PollingWatcher, create_watcher
+
+def inotify_watcher(root):
+    try:
+        return InotifyWatcher(str(root), RAW_FILE_PATTERN)
+    except OSError as e:
+        pytest.skip(f"inotify not available: {e}")
+
+def test_inotify_reports_complete_raw_files_in_new_partitions(tmp_path):
+    watcher = inotify_watcher(tmp_path)
+    try:
+        start = time.monotonic()
+        # A new YYYY-MM-DD/HH partition is created and the file lands in it.
+        file_path = extractor.save_raw_data([{"id": 1}], 1234567890, str(tmp_path))
+        landed = []
+        while file_path not in landed and time.monotonic() - start < 5:
+            landed.extend(watcher.wait(1))
+        assert file_path in landed
+        # The temporary file the snapshot was written to is never reported.
+        assert all(os.path.basename(path).startswith("raw_data_") for path in landed)
+        assert not [name for name in os.listdir(os.path.dirname(file_path)) if name.startswith(".")]
+    finally:
+        watcher.close()
+
+def test_inotify_ignores_files_still_being_written(tmp_path):
+    watcher = inotify_watcher(tmp_path)
+    try:
+        with open(tmp_path / "raw_data_1234567890.json", "w") as f:
+            f.write("[")
+            assert watcher.wait(0.1) == []
+        assert watcher.wait(1) == [str(tmp_path / "raw_data_1234567890.json")]
+    finally:
+        watcher.close()
+
+def test_inotify_ignores_temporary_files(tmp_path):
+    watcher = inotify_watcher(tmp_path)
+    try:
+        start = time.monotonic()
+        (tmp_path / ".raw_data_1234567890.json").write_text("[]")
+        # The dot-file's create and close events do not end the wait early.
+        assert watcher.wait(0.3) == []
+        assert time.monotonic() - start >= 0.25
+        os.replace(tmp_path / ".raw_data_1234567890.json", tmp_path / "raw_data_1234567890.json")
+        assert watcher.wait(1) == [str(tmp_path / "raw_data_1234567890.json")]
+    finally:
+        watcher.close()
+
+def test_polling_fallback(tmp_path):
+    watcher = create_watcher(str(tmp_path), RAW_FILE_PATTERN, mode="poll")
+    assert isinstance(watcher, PollingWatcher)
+    assert watcher.wait(0.01) == []
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from etl_pipeline import transform, writers
+from etl_pipeline.models import ProcessedUser
+
+users = [
+    ProcessedUser(user_id=i, username=f"user{i}", phone="1-770", email=f"user{i}@example.org",
+                  website="example.org", company_id=None if i == 2 else 100 + i,
+                  extraction_ts="2009-02-13T23:31:30+00:00")
+    for i in (3, 1, 2)
+]
+
+@pytest.mark.parametrize("fmt", ["csv", "colz", "parquet"])
+def test_writer_round_trip(tmp_path, fmt):
+    if fmt == "parquet" and writers.pq is None:
+        pytest.skip("pyarrow is not installed")
+    writer = writers.get_writer(fmt)
+    file_path = str(tmp_path / f"out{writer.extension}")
+    sink = writer.open(file_path, ProcessedUser)
+    # Two batches produce two row groups in the columnar formats.
+    sink.write_rows(users[:2])
+    sink.write_rows(users[2:])
+    sink.close()
+
+    rows = list(writer.iter_rows(file_path, columns=["user_id", "company_id"]))
+    assert [str(row["user_id"]) for row in rows] == ["3", "1", "2"]
+    if fmt != "csv":
+        assert rows[2] == {"user_id": 2, "company_id": None}, "Columnar formats should keep types and nulls."
+        stats = writer.read_stats(file_path)
+        assert (stats["user_id"]["min"], stats["user_id"]["max"]) == (1, 3)
+        assert stats["company_id"]["nulls"] == 1
+
+def test_model_schema_from_record_type():
+    assert writers.model_schema(ProcessedUser) == [
+        ("user_id", "int", False), ("username", "str", False), ("phone", "str", False), ("email", "str", False),
+        ("website", "str", False), ("company_id", "int", True), ("extraction_ts", "str", False),
+    ]
+
+def test_sink_without_write_columns_cannot_be_opened(tmp_path):
+    class RowsOnlySink(writers.OutputSink):
+        def close(self):
+            pass
+
+    with pytest.raises(TypeError, match="write_columns"):
+        RowsOnlySink(str(tmp_path / "out"), writers.model_schema(ProcessedUser))
+
+def test_colz_reads_only_requested_columns(tmp_path, monkeypatch):
+    writer = writers.get_writer("colz")
+    file_path = str(tmp_path / "out.colz")
+    sink = writer.open(file_path, ProcessedUser)
+    sink.write_rows(users)
+    sink.close()
+
+    decoded = []
+    real_loads = json.loads
+    monkeypatch.setattr(writers.json, "loads", lambda data: decoded.append(data) or real_loads(data))
+    assert [batch["email"] for batch in writer.iter_column_batches(file_path, ["email"])] == [[u.email for u in users]]
+    assert len(decoded) == 2, "Only the footer and the requested column chunk should be decoded."
+
+def test_parquet_falls_back_to_colz(monkeypatch):
+    monkeypatch.setattr(writers, "pq", None)
+    assert writers.get_writer("parquet").name == "colz"
+
+def test_transform_with_columnar_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(transform, "PROCESSED_DIR", str(tmp_path / "processed"))
+    monkeypatch.setattr(transform, "OUTPUT_FORMATS", dict(transform.OUTPUT_FORMATS))
+    transform.set_output_format("colz", ["processed_user"])
+    raw_file = tmp_path / "raw_data_1234567890.json"
+    raw_file.write_text(json.dumps([{
+        "id": 1, "name": "Leanne Graham", "username": "Bret", "email": "Sincere@april.biz",
+        "address": {"street": "Kulas Light", "suite": "Apt. 556", "city": "Gwenborough", "zipcode": "92998-3874",
+                    "geo": {"lat": "-37.3159", "lng": "81.1496"}},
+        "phone": "1-770-736-8031 x56442", "website": "hildegard.org",
+        "company": {"name": "Romaguera-Crona", "catchPhrase": "Multi-layered client-server neural-net",
+                    "bs": "harness real-time e-markets"},
+    }]))
+
+    outputs = transform.generic_transform(str(raw_file), 1234567890, transform.default_transformation_fn)
+    assert sorted(outputs) == sorted(transform.expected_output_files(1234567890, str(tmp_path / "processed")))
+    user_file = transform.output_file_path("processed_user", 1234567890, str(tmp_path / "processed"))
+    assert user_file.endswith(".colz") and os.path.exists(user_file)
+    assert [row["username"] for row in writers.get_writer("colz").iter_rows(user_file)] == ["Bret"]